@@ -0,0 +1,79 @@
+from boards import clean_champion_name
+
+# Per-player placement counters keyed by (puuid, game_type, champion, patch). The champion
+# '*' row counts whole games; champion rows count every fielded unit, like champion_stats.
+
+OVERALL = '*'
+PLACEMENTS = 8
+
+
+def empty_aggregate():
+    return {'games': 0, 'placement_sum': 0, 'top4': 0, 'wins': 0, 'placement_hist': [0] * PLACEMENTS}
+
+
+def add_placement(aggregate, placement, count=1):
+    aggregate['games'] += count
+    aggregate['placement_sum'] += placement * count
+    aggregate['top4'] += count if placement <= 4 else 0
+    aggregate['wins'] += count if placement == 1 else 0
+    aggregate['placement_hist'][placement - 1] += count
+
+
+def merge_aggregate(target, source):
+    for field in ('games', 'placement_sum', 'top4', 'wins'):
+        target[field] += source[field]
+    target['placement_hist'] = [a + b for a, b in zip(target['placement_hist'], source['placement_hist'])]
+    return target
+
+
+def board_entry(puuid, game_type, patch, placement, units):
+    return puuid, game_type, patch, placement, [clean_champion_name(unit['character_id']) for unit in units or []]
+
+
+def aggregate_boards(entries):
+    aggregates = {}
+    for puuid, game_type, patch, placement, champions in entries:
+        for champion in [OVERALL] + champions:
+            key = (puuid, game_type, champion, patch)
+            if key not in aggregates:
+                aggregates[key] = empty_aggregate()
+            add_placement(aggregates[key], placement)
+    return aggregates
+
+
+def merge_rows(rows, key=None):
+    merged = {}
+    for row in rows:
+        group = key(row) if key else None
+        if group not in merged:
+            merged[group] = empty_aggregate()
+        merge_aggregate(merged[group], row)
+    return merged if key else merged.get(None, empty_aggregate())
+
+
+def normalized_histogram(aggregate, game_type):
+    # Double Up placements come in pairs of teams, so 1-2 is first, 3-4 second and so on
+    if game_type != 'pairs':
+        return list(aggregate['placement_hist'])
+    histogram = [0] * PLACEMENTS
+    for i, count in enumerate(aggregate['placement_hist']):
+        histogram[i // 2] += count
+    return histogram
+
+
+def summarize(aggregate, game_type=None):
+    histogram = normalized_histogram(aggregate, game_type)
+    games = sum(histogram)
+    if not games:
+        return None
+    top4_count = sum(histogram[:4])
+    win_count = histogram[0]
+    return {
+        'games': games,
+        'avg_placement': sum((i + 1) * count for i, count in enumerate(histogram)) / games,
+        'top4_count': top4_count,
+        'top4_rate': top4_count / games * 100,
+        'win_count': win_count,
+        'win_rate': win_count / games * 100,
+        'placement_hist': {i + 1: count for i, count in enumerate(histogram) if count}
+    }
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+
+ARCHIVE_PATH = os.getenv('TFT_ARCHIVE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'match_archive.sqlite'))
+# zlib only looks back 32 KB, so a larger preset dictionary would be wasted
+DICTIONARY_SIZE = 32 * 1024
+# A dictionary trained on fewer payloads (the first batch ever stored) is replaced once this many are archived
+DICTIONARY_SAMPLE_SIZE = 200
+# After that a new dictionary is trained every RETRAIN_INTERVAL matches, so it follows each patch's unit and item names
+RETRAIN_INTERVAL = 5000
+TOKEN_PATTERN = re.compile(rb'"[^"]*":?')
+# Trait objects repeat across nearly every board; units rarely do once their items are included
+FRAGMENT_FIELDS = ('traits',)
+# Fragment ID lists in a canonical skeleton, e.g. "traits":[3,17,42]
+FRAGMENT_PATTERN = re.compile(rb'("(?:' + b'|'.join(field.encode() for field in FRAGMENT_FIELDS) + rb')":)\[([\d,]*)\]')
+
+# Raw Riot payloads archived by match_id. The unit and trait objects that repeat across matches
+# are content-addressed fragments (sha256 of canonical JSON) stored once; each match keeps a
+# skeleton holding fragment IDs, deflated against a versioned preset dictionary trained on the
+# key strings every skeleton repeats. Blobs record the dictionary they were compressed with.
+
+def canonical_payload(match_data):
+    return json.dumps(match_data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def train_dictionary(payloads, size=DICTIONARY_SIZE):
+    counts = Counter()
+    for payload in payloads:
+        counts.update(TOKEN_PATTERN.findall(payload))
+
+    tokens = []
+    total = 0
+    for token, count in sorted(counts.items(), key=lambda x: x[1] * len(x[0]), reverse=True):
+        if count < 2:
+            break
+        if total + len(token) > size:
+            continue
+        tokens.append(token)
+        total += len(token)
+    # Deflate finds the end of the dictionary cheapest to reference, so the most valuable tokens go last
+    return b''.join(reversed(tokens))
+
+
+class MatchArchive:
+    def __init__(self, path=ARCHIVE_PATH):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            create table if not exists dictionaries (dictionary_id integer primary key, data blob);
+            create table if not exists blobs (digest text primary key, dictionary_id integer, data blob);
+            create table if not exists match_index (match_id text primary key, digest text);
+            create table if not exists fragments (fragment_id integer primary key, digest text unique not null, data blob);
+        ''')
+        # Archives written before fragments and dictionary versioning get the new columns; old blobs hold whole payloads
+        self.add_column('dictionaries', 'trained_on', 'integer not null default 0')
+        self.add_column('blobs', 'fragmented', 'integer not null default 0')
+        self.connection.execute('create index if not exists blobs_dictionary_idx on blobs (dictionary_id)')
+        self.connection.commit()
+
+        self.dictionaries = {}
+        self.fragments = {}
+        self.fragment_ids = {}
+        self.fragment_keys = {}
+        self.dictionary_id = None
+        self.trained_on = 0
+        self.dictionary_uses = 0
+        row = self.connection.execute(
+            'select dictionary_id, trained_on from dictionaries order by dictionary_id desc limit 1').fetchone()
+        if row:
+            self.dictionary_id, self.trained_on = row
+            self.dictionary_uses, = self.connection.execute(
+                'select count(*) from blobs where dictionary_id = ?', (self.dictionary_id,)).fetchone()
+
+    def add_column(self, table, column, definition):
+        columns = {row[1] for row in self.connection.execute(f'pragma table_info({table})')}
+        if column not in columns:
+            self.connection.execute(f'alter table {table} add column {column} {definition}')
+
+    def dictionary(self, dictionary_id):
+        # Another process may have trained a newer dictionary since this one was opened
+        if dictionary_id not in self.dictionaries:
+            row = self.connection.execute('select data from dictionaries where dictionary_id = ?', (dictionary_id,)).fetchone()
+            self.dictionaries[dictionary_id] = row[0]
+        return self.dictionaries[dictionary_id]
+
+    def needs_dictionary(self):
+        if self.dictionary_id is None:
+            return True
+        if self.trained_on < DICTIONARY_SAMPLE_SIZE:
+            return self.dictionary_uses >= DICTIONARY_SAMPLE_SIZE
+        return self.dictionary_uses >= RETRAIN_INTERVAL
+
+    def add_dictionary(self, payloads):
+        payloads = list(payloads)
+        data = train_dictionary(payloads)
+        cursor = self.connection.execute('insert into dictionaries (data, trained_on) values (?, ?)', (data, len(payloads)))
+        self.dictionaries[cursor.lastrowid] = data
+        self.dictionary_id, self.trained_on, self.dictionary_uses = cursor.lastrowid, len(payloads), 0
+        return cursor.lastrowid
+
+    def compress(self, payload, dictionary_id):
+        if dictionary_id is None:
+            return zlib.compress(payload, 9)
+        compressor = zlib.compressobj(9, zdict=self.dictionary(dictionary_id))
+        return compressor.compress(payload) + compressor.flush()
+
+    def decompress(self, data, dictionary_id):
+        if dictionary_id is None:
+            return zlib.decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionary(dictionary_id))
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def fragment_id(self, fragment):
+        fragment_id = self.fragment_ids.get(fragment)
+        if fragment_id is None:
+            digest = hashlib.sha256(fragment).hexdigest()
+            self.connection.execute('insert or ignore into fragments (digest, data) values (?, ?)', (digest, fragment))
+            fragment_id, = self.connection.execute('select fragment_id from fragments where digest = ?', (digest,)).fetchone()
+            self.fragment_ids[fragment] = fragment_id
+            self.fragments[fragment_id] = fragment
+        return fragment_id
+
+    def value_fragment_id(self, value):
+        # Flat objects such as traits are looked up by their items, skipping a json.dumps per repeat
+        try:
+            key = tuple((name, type(item), item) for name, item in value.items())
+            fragment_id = self.fragment_keys.get(key)
+        except TypeError:
+            key = fragment_id = None
+        if fragment_id is None:
+            fragment_id = self.fragment_id(canonical_payload(value))
+            if key is not None:
+                self.fragment_keys[key] = fragment_id
+        return fragment_id
+
+    def skeleton(self, match_data):
+        participants = []
+        for participant in match_data['info']['participants']:
+            participant = dict(participant)
+            for field in FRAGMENT_FIELDS:
+                if field in participant:
+                    participant[field] = [self.value_fragment_id(value) for value in participant[field]]
+            participants.append(participant)
+        return canonical_payload({**match_data, 'info': {**match_data['info'], 'participants': participants}})
+
+    def load_fragments(self, fragment_ids):
+        missing_ids = [fragment_id for fragment_id in fragment_ids if fragment_id not in self.fragments]
+        for i in range(0, len(missing_ids), 500):
+            chunk = missing_ids[i:i + 500]
+            rows = self.connection.execute(
+                f'select fragment_id, data from fragments where fragment_id in ({", ".join("?" * len(chunk))})', chunk)
+            for fragment_id, data in rows:
+                self.fragments[fragment_id] = data
+                self.fragment_ids[data] = fragment_id
+
+    def restore(self, skeleton):
+        # Fragment IDs are spliced back as JSON text, so each match is still decoded by one json.loads
+        references = FRAGMENT_PATTERN.findall(skeleton)
+        self.load_fragments({int(fragment_id) for _, ids in references for fragment_id in ids.split(b',') if fragment_id})
+        return FRAGMENT_PATTERN.sub(
+            lambda match: match.group(1) + b'[' + b','.join(
+                self.fragments[int(fragment_id)] for fragment_id in match.group(2).split(b',') if fragment_id) + b']',
+            skeleton)
+
+    def recent_skeletons(self, limit):
+        rows = self.connection.execute(
+            'select dictionary_id, fragmented, data from blobs order by rowid desc limit ?', (limit,)).fetchall()
+        skeletons = []
+        for dictionary_id, fragmented, data in rows:
+            payload = self.decompress(data, dictionary_id)
+            skeletons.append(payload if fragmented else self.skeleton(json.loads(payload)))
+        return skeletons
+
+    def archived_ids(self, match_ids):
+        archived_ids = set()
+        for i in range(0, len(match_ids), 500):
+            chunk = match_ids[i:i + 500]
+            archived_ids.update(row[0] for row in self.connection.execute(
+                f'select match_id from match_index where match_id in ({", ".join("?" * len(chunk))})', chunk))
+        return archived_ids
+
+    def put_many(self, matches):
+        matches = {match['metadata']['match_id']: match for match in matches}
+        if not matches:
+            return []
+        with self.lock, self.connection:
+            # Riot payloads never change, so matches already archived are left as they are
+            archived_ids = self.archived_ids(list(matches))
+            skeletons = {match_id: self.skeleton(match) for match_id, match in matches.items() if match_id not in archived_ids}
+            if skeletons and self.needs_dictionary():
+                sample = list(skeletons.values())
+                self.add_dictionary(sample + self.recent_skeletons(max(DICTIONARY_SAMPLE_SIZE - len(sample), 0)))
+
+            for match_id, payload in skeletons.items():
+                digest = hashlib.sha256(payload).hexdigest()
+                exists = self.connection.execute('select 1 from blobs where digest = ?', (digest,)).fetchone()
+                if not exists:
+                    self.connection.execute('insert into blobs (digest, dictionary_id, data, fragmented) values (?, ?, ?, 1)',
+                                            (digest, self.dictionary_id, self.compress(payload, self.dictionary_id)))
+                    self.dictionary_uses += 1
+                self.connection.execute('insert or replace into match_index values (?, ?)', (match_id, digest))
+        return list(matches)
+
+    def retrain(self, sample_size=DICTIONARY_SAMPLE_SIZE):
+        # Only new blobs use the new dictionary; existing ones keep decompressing with the one they recorded
+        with self.lock, self.connection:
+            return self.add_dictionary(self.recent_skeletons(sample_size))
+
+    def get_many(self, match_ids):
+        match_ids = list(match_ids)
+        matches = {}
+        with self.lock:
+            for i in range(0, len(match_ids), 500):
+                chunk = match_ids[i:i + 500]
+                rows = self.connection.execute(
+                    f'select match_index.match_id, blobs.dictionary_id, blobs.fragmented, blobs.data from match_index '
+                    f'join blobs on blobs.digest = match_index.digest '
+                    f'where match_index.match_id in ({", ".join("?" * len(chunk))})', chunk).fetchall()
+                for match_id, dictionary_id, fragmented, data in rows:
+                    payload = self.decompress(data, dictionary_id)
+                    matches[match_id] = json.loads(self.restore(payload) if fragmented else payload)
+        return matches
+
+    def get(self, match_id):
+        return self.get_many([match_id]).get(match_id)
+
+    def iter_match_ids(self, page_size=500):
+        last_match_id = ''
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    'select match_id from match_index where match_id > ? order by match_id limit ?',
+                    (last_match_id, page_size)).fetchall()
+            if not rows:
+                return
+            yield from (row[0] for row in rows)
+            last_match_id = rows[-1][0]
+
+    def iter_matches(self, page_size=100):
+        match_ids = []
+        for match_id in self.iter_match_ids():
+            match_ids.append(match_id)
+            if len(match_ids) == page_size:
+                yield from self.get_many(match_ids).values()
+                match_ids = []
+        if match_ids:
+            yield from self.get_many(match_ids).values()
+
+    def stats(self):
+        with self.lock:
+            matches, = self.connection.execute('select count(*) from match_index').fetchone()
+            blobs, blob_bytes = self.connection.execute('select count(*), coalesce(sum(length(data)), 0) from blobs').fetchone()
+            fragments, fragment_bytes = self.connection.execute(
+                'select count(*), coalesce(sum(length(data)), 0) from fragments').fetchone()
+            dictionaries, = self.connection.execute('select count(*) from dictionaries').fetchone()
+        return {'matches': matches, 'blobs': blobs, 'fragments': fragments, 'dictionaries': dictionaries,
+                'compressed_bytes': blob_bytes + fragment_bytes}
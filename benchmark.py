@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Synthetic Set 15 payloads following the Riot match-v1 schema, served by a local stub
+# Riot server and stored in the embedded SQLite backend, so every run is offline and repeatable.
+
+CHAMPIONS = {
+    1: ['Aatrox', 'Ezreal', 'Garen', 'Gnar', 'Kalista', 'Kayle', 'Kennen', 'Lucian', 'Malphite', 'Naafiri', 'Rell',
+        'Sivir', 'Syndra', 'Zac'],
+    2: ['Dr. Mundo', 'Gangplank', 'Janna', 'Jhin', 'Kaisa', 'Katarina', 'Kobuko', 'Lux', 'Rakan', 'Shen', 'Vi',
+        'XayahRakan', 'XinZhao'],
+    3: ['Ahri', 'Caitlyn', 'Darius', 'Jayce', 'KogMaw', 'Malzahar', 'Neeko', 'Senna', 'Swain', 'Udyr', 'Viego',
+        'Yasuo', 'Ziggs'],
+    4: ['Akali', 'Ashe', 'Jarvan IV', 'Jinx', 'KSante', 'Karma', 'Leona', 'Poppy', 'Ryze', 'Samira', 'Sett',
+        'Volibear', 'Yuumi'],
+    5: ['Braum', 'Gwen', 'LeeSin', 'Seraphine', 'Twisted Fate', 'Varus', 'Yone', 'Zyra']
+}
+ITEMS = ['Deathblade', 'GuardianAngel', 'RunaansHurricane', 'InfinityEdge', 'JeweledGauntlet', 'Bloodthirster',
+         'TitansResolve', 'WarmogsArmor', 'DragonsClaw', 'GargoyleStoneplate', 'Morellonomicon', 'RabadonsDeathcap',
+         'ArchangelsStaff', 'Quicksilver', 'SpearOfShojin', 'HextechGunblade', 'IonicSpark', 'RedBuff', 'LastWhisper',
+         'MadredsBloodrazor', 'StatikkShiv', 'SpectralGauntlet', 'BrambleVest', 'SunfireCape', 'Redemption']
+TRAITS = ['BattleAcademia', 'StarGuardian', 'SoulFighter', 'SupremeCells', 'TheCrew', 'Mentor', 'Wraith', 'Sniper',
+          'Bastion', 'Juggernaut', 'Duelist', 'Executioner', 'Heavyweight', 'Protector', 'Sorcerer', 'Strategist',
+          'Edgelord', 'Prodigy', 'MightyMech', 'Luchador', 'RosemotherEmblem']
+CHAMPION_POOL = [(cost, name) for cost, names in CHAMPIONS.items() for name in names]
+
+
+def generate_unit(rng, level):
+    cost, name = rng.choice(CHAMPION_POOL[:max(14, level * 8)])
+    items = rng.sample(ITEMS, rng.choice([0, 0, 1, 2, 3, 3]))
+    return {
+        'character_id': f"TFT15_{name.replace(' ', '').replace('.', '')}",
+        'itemNames': [f'TFT_Item_{item}' for item in items],
+        'name': '',
+        'rarity': {1: 0, 2: 1, 3: 2, 4: 4, 5: 6}[cost],
+        'tier': rng.choices([1, 2, 3], [0.45, 0.5, 0.05])[0]
+    }
+
+
+def generate_participant(rng, puuid, placement, game_datetime):
+    level = rng.choices([6, 7, 8, 9, 10], [0.05, 0.2, 0.45, 0.25, 0.05])[0]
+    traits = []
+    for name in rng.sample(TRAITS, rng.randint(6, 11)):
+        num_units = rng.randint(1, 7)
+        tier_total = rng.randint(2, 4)
+        tier_current = min(tier_total, num_units // 2)
+        traits.append({
+            'name': f'TFT15_{name}',
+            'num_units': num_units,
+            'style': tier_current,
+            'tier_current': tier_current,
+            'tier_total': tier_total
+        })
+    return {
+        'companion': {'content_ID': f'companion-{rng.randint(1, 400)}', 'item_ID': rng.randint(1, 9999),
+                      'skin_ID': rng.randint(1, 60), 'species': 'PetTFTAvatar'},
+        'gold_left': rng.randint(0, 60),
+        'last_round': 20 + (9 - placement) * 3 + rng.randint(0, 3),
+        'level': level,
+        'missions': {'PlayerScore2': rng.randint(0, 200)},
+        'placement': placement,
+        'players_eliminated': rng.randint(0, 3),
+        'puuid': puuid,
+        'riotIdGameName': puuid.split('-')[-1],
+        'riotIdTagline': 'EUW',
+        'time_eliminated': game_datetime / 1000 % 2000,
+        'total_damage_to_players': rng.randint(0, 200),
+        'traits': traits,
+        'units': [generate_unit(rng, level) for _ in range(rng.randint(level - 1, level + 1))],
+        'win': placement <= 4
+    }
+
+
+def generate_match(rng, match_id, puuids, game_datetime, set_number=15):
+    placements = rng.sample(range(1, 9), len(puuids))
+    return {
+        'metadata': {'data_version': '6', 'match_id': match_id, 'participants': puuids},
+        'info': {
+            'endOfGameResult': 'GameComplete',
+            'gameCreation': game_datetime - 2_000_000,
+            'gameId': int(match_id.split('_')[1]),
+            'game_datetime': game_datetime,
+            'game_length': rng.uniform(1500, 2400),
+            'game_version': 'Linux Version 15.17.705.9102 (Aug 28 2025/14:23:13) [PUBLIC] <Releasewatch>',
+            'mapId': 22,
+            'participants': [generate_participant(rng, puuid, placement, game_datetime)
+                             for puuid, placement in zip(puuids, placements)],
+            'queueId': 1100,
+            'tft_game_type': rng.choices(['standard', 'pairs'], [0.7, 0.3])[0],
+            'tft_set_core_name': f'TFTSet{set_number}',
+            'tft_set_number': set_number
+        }
+    }
+
+
+def generate_matches(num_matches, num_players, seed=0, off_set_rate=0.02):
+    rng = random.Random(seed)
+    players = [f'puuid-{i:04d}-player{i}' for i in range(max(num_players, 8))]
+    start = 1_756_000_000_000
+    matches = []
+    for i in range(num_matches):
+        set_number = 14 if rng.random() < off_set_rate else 15
+        matches.append(generate_match(rng, f'EUW1_{7_000_000_000 + i}', rng.sample(players, 8),
+                                      start + i * 600_000, set_number))
+    return players[:num_players], matches
+
+
+class StubRiotHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    matches = {}
+    match_ids_by_puuid = {}
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-App-Rate-Limit', '500:10,30000:600')
+        self.send_header('X-Method-Rate-Limit', '2000:10')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        query = parse_qs(url.query)
+
+        if 'by-riot-id' in parts:
+            return self.send_json({'puuid': parts[-2], 'gameName': parts[-2], 'tagLine': parts[-1]})
+        if 'by-puuid' in parts:
+            start = int(query.get('start', [0])[0])
+            count = int(query.get('count', [20])[0])
+            start_time = int(query.get('startTime', [0])[0]) * 1000
+            match_ids = [match_id for match_id in self.match_ids_by_puuid.get(parts[-2], [])
+                         if self.matches[match_id]['info']['game_datetime'] >= start_time]
+            return self.send_json(match_ids[start:start + count])
+        if parts[-1] in self.matches:
+            return self.send_json(self.matches[parts[-1]])
+
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def start_stub_riot_server(matches):
+    match_ids_by_puuid = {}
+    for match in sorted(matches, key=lambda m: m['info']['game_datetime'], reverse=True):
+        for puuid in match['metadata']['participants']:
+            match_ids_by_puuid.setdefault(puuid, []).append(match['metadata']['match_id'])
+
+    handler = type('Handler', (StubRiotHandler,), {
+        'matches': {match['metadata']['match_id']: match for match in matches},
+        'match_ids_by_puuid': match_ids_by_puuid
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def measure(function, *args, repeat=3, **kwargs):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'repeat': repeat}, result
+
+
+def run_benchmarks(num_matches=2000, num_players=20, seed=0, repeat=3):
+    workdir = tempfile.mkdtemp(prefix='tft-bench-')
+    players, matches = generate_matches(num_matches, num_players, seed)
+    server, base_url = start_stub_riot_server(matches)
+
+    # Storage and API settings are read at import time, so they must be in place before the project modules load
+    os.environ.update({
+        'TFT_STORAGE_BACKEND': 'sqlite',
+        'TFT_SQLITE_PATH': os.path.join(workdir, 'bench.sqlite'),
+        'TFT_ARCHIVE_PATH': os.path.join(workdir, 'archive.sqlite'),
+        'TFT_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'RIOT_API_BASE': base_url
+    })
+    import models
+    import ingest
+    import tft
+    import explorer
+    import metrics
+
+    results = {}
+    roster = [{'username': puuid, 'tag': 'EUW'} for puuid in players]
+    results['ingest.update_players'], _ = measure(ingest.update_players, roster, max_matches=num_matches, repeat=1)
+    # Where ingest time went: rate-limit waits, HTTP round trips, DB writes and archive compression
+    ingest_metrics = metrics.registry.snapshot()
+
+    in_set = [match for match in matches if match['info']['tft_set_number'] == 15]
+    sample = in_set[:min(250, len(in_set))]
+    results['models.store_matches'], _ = measure(models.store_matches, sample, repeat=repeat)
+    results['models.store_participant_relations_bulk'], _ = measure(models.store_participant_relations_bulk, sample,
+                                                                    repeat=repeat)
+    results['models.get_existing_match_ids'], _ = measure(
+        models.get_existing_match_ids, [match['metadata']['match_id'] for match in sample], repeat=repeat)
+
+    puuid = players[0]
+    models.invalidate_player_matches()
+    results['models.get_player_matches.cold'], history = measure(models.get_player_matches, puuid, repeat=1)
+    results['models.get_player_matches.cached'], _ = measure(models.get_player_matches, puuid, repeat=repeat)
+    results['models.get_raw_matches'], _ = measure(
+        models.get_raw_matches, [match['metadata']['match_id'] for match in sample], repeat=repeat)
+
+    results['tft.analyze_champion_perfs'], _ = measure(tft.analyze_champion_perfs, history, repeat=repeat)
+    results['explorer.calculate_stats_by_game_type'], _ = measure(explorer.calculate_stats_by_game_type, history,
+                                                                  repeat=repeat)
+    results['explorer.filter_matches'], _ = measure(explorer.filter_matches, history,
+                                                    {'champion': 'Jhin', 'items': ['Deathblade'], 'max_items': 2},
+                                                    repeat=repeat)
+    results['explorer.analyze_explorer_data'], _ = measure(explorer.analyze_explorer_data, puuid, repeat=repeat)
+
+    server.shutdown()
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'params': {'num_matches': num_matches, 'num_players': num_players, 'seed': seed, 'repeat': repeat},
+        'sizes': {'matches': len(matches), 'history': len(history),
+                  'archive': models.get_archive().stats(), 'match_cache': models.get_match_cache_stats()},
+        'results': results,
+        'ingest_metrics': ingest_metrics
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ingest and analytics against synthetic matches')
+    parser.add_argument('--matches', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.matches, args.players, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,139 @@
+import re
+import threading
+
+# Compact, interned representation of stored boards. Riot IDs such as TFT15_Jhin or
+# TFT_Item_Deathblade are parsed once per distinct string into integer IDs shared
+# by every loaded history.
+
+def clean_champion_name(character_id):
+    return character_id.split('_')[1]
+
+def clean_item_name(item_name):
+    return item_name.split('_')[-1]
+
+def clean_trait_name(trait_name):
+    return trait_name.split('_')[1]
+
+def parse_patch(game_version):
+    match = re.search(r'(\d+)\.(\d+)', game_version or '')
+    if not match:
+        return None
+    return f'{match.group(1)}.{match.group(2)}'
+
+
+class Registry:
+    def __init__(self, parse):
+        self.parse = parse
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.names = []
+        self.raw_ids = {}
+
+    def id(self, raw_name):
+        registry_id = self.raw_ids.get(raw_name)
+        if registry_id is None:
+            with self.lock:
+                name = self.parse(raw_name)
+                registry_id = self.ids.get(name)
+                if registry_id is None:
+                    registry_id = len(self.names)
+                    self.ids[name] = registry_id
+                    self.names.append(name)
+                self.raw_ids[raw_name] = registry_id
+        return registry_id
+
+    def name(self, registry_id):
+        return self.names[registry_id]
+
+    def lookup(self, name):
+        return self.ids.get(name)
+
+
+CHAMPIONS = Registry(clean_champion_name)
+ITEMS = Registry(clean_item_name)
+TRAITS = Registry(clean_trait_name)
+
+
+class Unit:
+    __slots__ = ('champion', 'stars', 'items')
+
+    def __init__(self, champion, stars, items):
+        self.champion = champion
+        self.stars = stars
+        self.items = items
+
+    @property
+    def champion_name(self):
+        return CHAMPIONS.names[self.champion]
+
+    @property
+    def item_names(self):
+        return [ITEMS.names[item] for item in self.items]
+
+
+class Trait:
+    __slots__ = ('trait', 'num_units', 'tier')
+
+    def __init__(self, trait, num_units, tier):
+        self.trait = trait
+        self.num_units = num_units
+        self.tier = tier
+
+    @property
+    def name(self):
+        return TRAITS.names[self.trait]
+
+
+class Board:
+    __slots__ = ('match_id', 'placement', 'game_type', 'units', 'traits', 'total_damage_to_players',
+                 'riot_id_game_name', 'level', 'gold_left', 'board_value', 'last_round', 'patch_number')
+
+    def __init__(self, match_id, placement, game_type, units, traits, total_damage_to_players=0,
+                 riot_id_game_name='Unknown', level=None, gold_left=None, board_value=None, last_round=None,
+                 patch_number=None):
+        self.match_id = match_id
+        self.placement = placement
+        self.game_type = game_type
+        self.units = units
+        self.traits = traits
+        self.total_damage_to_players = total_damage_to_players
+        self.riot_id_game_name = riot_id_game_name
+        self.level = level
+        self.gold_left = gold_left
+        self.board_value = board_value
+        self.last_round = last_round
+        self.patch_number = patch_number
+
+
+def parse_unit(unit):
+    return Unit(CHAMPIONS.id(unit['character_id']),
+                unit.get('tier', 1),
+                tuple(ITEMS.id(item_name) for item_name in unit.get('itemNames', [])))
+
+def parse_trait(trait):
+    return Trait(TRAITS.id(trait['name']), trait['num_units'], trait['tier_current'])
+
+def parse_board(row):
+    return Board(row['match_id'],
+                 row['placement'],
+                 row['game_type'],
+                 [parse_unit(unit) for unit in row['units'] or []],
+                 [parse_trait(trait) for trait in row['traits'] or []],
+                 row['total_damage_to_players'] or 0,
+                 row['riot_id_game_name'] or 'Unknown',
+                 row['level'],
+                 row['gold_left'],
+                 row.get('board_value'),
+                 row.get('last_round'),
+                 row.get('patch_number'))
+
+def parse_participant(match_data, participant):
+    return Board(match_data['metadata']['match_id'],
+                 participant['placement'],
+                 match_data['info']['tft_game_type'],
+                 [parse_unit(unit) for unit in participant['units']],
+                 [parse_trait(trait) for trait in participant['traits']],
+                 participant.get('total_damage_to_players', 0),
+                 participant.get('riotIdGameName', 'Unknown'),
+                 participant.get('level'),
+                 participant.get('gold_left'))
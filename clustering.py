@@ -0,0 +1,180 @@
+import zlib
+from collections import Counter
+import numpy as np
+from aggregates import empty_aggregate, add_placement, summarize
+from boards import parse_participant
+
+# Boards grouped into archetypes ("comps") by Jaccard similarity of their champion, active
+# trait tier and item tokens. MinHash signatures banded into LSH buckets find candidate
+# archetypes without comparing against every leader, so boards are assigned in one pass and
+# new boards are classified incrementally.
+
+NUM_PERM = 64
+# 32 bands of 2 rows make boards at the similarity threshold collide in some band ~95% of the time
+BANDS = 32
+SIMILARITY_THRESHOLD = 0.3
+# Prime just above 2**32, so (a * x + b) mod PRIME never overflows uint64 for 32-bit token hashes
+PRIME = np.uint64(4294967311)
+
+
+def board_tokens(board):
+    tokens = set()
+    for unit in board.units:
+        tokens.add(f'c:{unit.champion_name}')
+        tokens.update(f'i:{item}' for item in unit.item_names)
+    tokens.update(f't:{trait.name}:{trait.tier}' for trait in board.traits if trait.tier > 0)
+    return frozenset(tokens)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0
+
+
+class Archetype:
+    __slots__ = ('archetype_id', 'leader', 'boards', 'aggregates', 'token_counts')
+
+    def __init__(self, archetype_id, leader):
+        self.archetype_id = archetype_id
+        self.leader = leader
+        self.boards = 0
+        # Placements are kept per game type, since Double Up placements only mean something in pairs
+        self.aggregates = {}
+        self.token_counts = Counter()
+
+    def add(self, tokens, placement, game_type):
+        self.boards += 1
+        if game_type not in self.aggregates:
+            self.aggregates[game_type] = empty_aggregate()
+        add_placement(self.aggregates[game_type], placement)
+        self.token_counts.update(tokens)
+
+    def core(self, prefix, share=0.5):
+        return [token.split(':', 1)[1] for token, count in self.token_counts.most_common()
+                if token.startswith(prefix) and count >= self.boards * share]
+
+    def label(self):
+        traits = self.core('t:')[:2]
+        champions = self.core('c:')[:2]
+        trait_label = ' / '.join(trait.rsplit(':', 1)[0] for trait in traits)
+        champion_label = ', '.join(champions)
+        return f'{trait_label} ({champion_label})' if trait_label and champion_label else trait_label or champion_label
+
+
+class ArchetypeIndex:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.a = rng.integers(1, 2 ** 31, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 2 ** 31, num_perm, dtype=np.uint64)[:, None]
+        self.token_hashes = {}
+        self.buckets = {}
+        self.archetypes = []
+
+    def token_hash(self, token):
+        token_hash = self.token_hashes.get(token)
+        if token_hash is None:
+            token_hash = self.token_hashes[token] = zlib.crc32(token.encode())
+        return token_hash
+
+    def signature(self, tokens):
+        hashes = np.fromiter((self.token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+        return ((self.a * hashes + self.b) % PRIME).min(axis=1)
+
+    def band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def nearest(self, tokens, signature):
+        candidates = {archetype_id for key in self.band_keys(signature) for archetype_id in self.buckets.get(key, ())}
+        best, best_similarity = None, self.threshold
+        for archetype_id in candidates:
+            similarity = jaccard(tokens, self.archetypes[archetype_id].leader)
+            if similarity >= best_similarity:
+                best, best_similarity = archetype_id, similarity
+        return best
+
+    def classify(self, board):
+        tokens = board_tokens(board)
+        if not tokens:
+            return None
+        archetype_id = self.nearest(tokens, self.signature(tokens))
+        return self.archetypes[archetype_id] if archetype_id is not None else None
+
+    def add(self, board):
+        tokens = board_tokens(board)
+        if not tokens:
+            return None
+        signature = self.signature(tokens)
+        archetype_id = self.nearest(tokens, signature)
+        if archetype_id is None:
+            archetype_id = len(self.archetypes)
+            self.archetypes.append(Archetype(archetype_id, tokens))
+            for key in self.band_keys(signature):
+                self.buckets.setdefault(key, []).append(archetype_id)
+        archetype = self.archetypes[archetype_id]
+        archetype.add(tokens, board.placement, board.game_type)
+        return archetype
+
+    def add_many(self, boards):
+        for board in boards:
+            self.add(board)
+        return self
+
+    def report(self, min_boards=1, game_type=None):
+        # One row per archetype and game type; min_boards counts that game type's boards
+        rows = []
+        for archetype in self.archetypes:
+            for row_game_type, aggregate in archetype.aggregates.items():
+                if game_type is not None and row_game_type != game_type:
+                    continue
+                if aggregate['games'] >= min_boards:
+                    rows.append({
+                        'archetype_id': archetype.archetype_id,
+                        'game_type': row_game_type,
+                        'label': archetype.label(),
+                        'champions': archetype.core('c:'),
+                        'traits': archetype.core('t:'),
+                        'items': archetype.core('i:', 0.25),
+                        **summarize(aggregate, row_game_type)
+                    })
+        return sorted(rows, key=lambda row: row['avg_placement'])
+
+
+def iter_match_boards(matches):
+    for match_data in matches:
+        for participant in match_data['info']['participants']:
+            yield parse_participant(match_data, participant)
+
+
+def build_archetypes(boards, threshold=SIMILARITY_THRESHOLD):
+    return ArchetypeIndex(threshold).add_many(boards)
+
+
+def display_archetypes(index, min_boards=20, top=20, game_type='standard'):
+    rows = index.report(min_boards, game_type)
+    if not rows:
+        print('No archetypes with enough boards')
+        return
+    print(f'{len(index.archetypes)} archetypes, {len(rows)} with at least {min_boards} {game_type} boards')
+    for row in rows[:top]:
+        print(f"\n{row['label'] or 'Mixed'}: {row['avg_placement']:.2f} avg, {row['top4_rate']:.1f}% top 4, "
+              f"{row['win_rate']:.1f}% wins over {row['games']} boards")
+        print(f"  Core units: {', '.join(row['champions'])}")
+        if row['items']:
+            print(f"  Common items: {', '.join(row['items'][:6])}")
+
+
+if __name__ == '__main__':
+    import argparse
+    from models import iter_player_matches, iter_raw_matches
+
+    parser = argparse.ArgumentParser(description='Cluster stored boards into archetypes')
+    parser.add_argument('--puuid', help='only this player\'s boards instead of every stored participant')
+    parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD)
+    parser.add_argument('--min-boards', type=int, default=20)
+    parser.add_argument('--game-type', default='standard')
+    args = parser.parse_args()
+
+    boards = iter_player_matches(args.puuid) if args.puuid else iter_match_boards(iter_raw_matches())
+    display_archetypes(build_archetypes(boards, args.threshold), args.min_boards, game_type=args.game_type)
@@ -0,0 +1,140 @@
+import numpy as np
+
+from boards import CHAMPIONS, ITEMS, TRAITS
+
+# Match histories flattened into column arrays: one row per match, per unit, per item and per trait.
+# Champions, items and traits use the shared registry IDs; builds and game types are coded per table.
+
+
+def code(vocabulary, key):
+    return vocabulary.setdefault(key, len(vocabulary))
+
+
+def flatten_matches(matches):
+    builds, game_types = {}, {}
+    placement, game_type = [], []
+    unit_match, unit_champion, unit_stars, unit_build, unit_item_count = [], [], [], [], []
+    item_unit, item_code = [], []
+    trait_match, trait_code, trait_tier, trait_units = [], [], [], []
+
+    for match_idx, match in enumerate(matches):
+        placement.append(match.placement)
+        game_type.append(code(game_types, match.game_type))
+
+        for unit in match.units:
+            item_unit.extend([len(unit_match)] * len(unit.items))
+            item_code.extend(unit.items)
+
+            unit_match.append(match_idx)
+            unit_champion.append(unit.champion)
+            unit_stars.append(unit.stars)
+            unit_build.append(code(builds, tuple(sorted(unit.items))))
+            unit_item_count.append(len(unit.items))
+
+        for trait in match.traits:
+            trait_match.append(match_idx)
+            trait_code.append(trait.trait)
+            trait_tier.append(trait.tier)
+            trait_units.append(trait.num_units)
+
+    placement = np.array(placement, dtype=np.int8)
+    game_type = np.array(game_type, dtype=np.int16)
+    pairs_code = game_types.get('pairs', -1)
+
+    return {
+        'placement': placement,
+        'normalized_placement': np.where(game_type == pairs_code, (placement + 1) // 2, placement).astype(np.int8),
+        'game_type': game_type,
+        'unit_match': np.array(unit_match, dtype=np.int32),
+        'unit_champion': np.array(unit_champion, dtype=np.int32),
+        'unit_stars': np.array(unit_stars, dtype=np.int8),
+        'unit_build': np.array(unit_build, dtype=np.int32),
+        'unit_item_count': np.array(unit_item_count, dtype=np.int8),
+        'item_unit': np.array(item_unit, dtype=np.int32),
+        'item_code': np.array(item_code, dtype=np.int32),
+        'trait_match': np.array(trait_match, dtype=np.int32),
+        'trait_code': np.array(trait_code, dtype=np.int32),
+        'trait_tier': np.array(trait_tier, dtype=np.int8),
+        'trait_units': np.array(trait_units, dtype=np.int8),
+        'champions': list(CHAMPIONS.names),
+        'items': list(ITEMS.names),
+        'builds': list(builds),
+        'traits': list(TRAITS.names),
+        'game_types': list(game_types)
+    }
+
+
+def placement_stats(groups, placements, size):
+    games = np.bincount(groups, minlength=size)
+    placement_sum = np.bincount(groups, weights=placements, minlength=size)
+    top4_count = np.bincount(groups, weights=placements <= 4, minlength=size)
+    win_count = np.bincount(groups, weights=placements == 1, minlength=size)
+    return games, placement_sum, top4_count.astype(np.int64), win_count.astype(np.int64)
+
+
+def group_placements(groups, placements, size):
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(size + 1))
+    sorted_placements = placements[order]
+    return [sorted_placements[bounds[i]:bounds[i + 1]] for i in range(size)]
+
+
+def champion_stats(table):
+    size = len(table['champions'])
+    placements = table['placement'][table['unit_match']]
+    games, placement_sum, top4_count, win_count = placement_stats(table['unit_champion'], placements, size)
+    grouped = group_placements(table['unit_champion'], placements, size)
+
+    champion_stats = {}
+    for champion_code, champion in enumerate(table['champions']):
+        if games[champion_code]:
+            champion_stats[champion] = {
+                'placements': grouped[champion_code].tolist(),
+                'games': int(games[champion_code]),
+                'avg_placement': placement_sum[champion_code] / games[champion_code],
+                'top4_count': int(top4_count[champion_code]),
+                'top4_rate': top4_count[champion_code] / games[champion_code] * 100,
+                'win_count': int(win_count[champion_code]),
+                'win_rate': win_count[champion_code] / games[champion_code] * 100
+            }
+    return champion_stats
+
+
+def game_type_stats(table):
+    size = len(table['game_types'])
+    placements = table['normalized_placement']
+    games, placement_sum, top4_count, win_count = placement_stats(table['game_type'], placements, size)
+    grouped = group_placements(table['game_type'], placements, size)
+
+    stats = {}
+    for game_type_code, game_type in enumerate(table['game_types']):
+        if games[game_type_code]:
+            stats[game_type] = {
+                'matches': int(games[game_type_code]),
+                'avg_placement': placement_sum[game_type_code] / games[game_type_code],
+                'top4_rate': top4_count[game_type_code] / games[game_type_code] * 100,
+                'win_rate': win_count[game_type_code] / games[game_type_code] * 100,
+                'placements': grouped[game_type_code].tolist()
+            }
+    return stats
+
+
+def build_stats(table):
+    num_builds = len(table['builds'])
+    keys = table['unit_champion'].astype(np.int64) * num_builds + table['unit_build']
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    placements = table['placement'][table['unit_match']]
+    grouped = group_placements(inverse, placements, len(unique_keys))
+
+    builds = []
+    for group, key in enumerate(unique_keys.tolist()):
+        champion_code, build_code = divmod(key, num_builds)
+        items = [table['items'][item_code] for item_code in table['builds'][build_code]]
+        builds.append((table['champions'][champion_code], items, grouped[group].tolist()))
+    return builds
+
+
+def active_trait_units(table):
+    active = table['trait_tier'] > 0
+    pairs = np.unique(np.stack([table['trait_code'][active], table['trait_units'][active].astype(np.int32)]), axis=1)
+    return [(table['traits'][trait_code], int(num_units)) for trait_code, num_units in pairs.T.tolist()]
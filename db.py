@@ -1,11 +1,24 @@
-from supabase import create_client
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 def get_supabase_client():
+    from supabase import create_client
     return create_client(
         os.getenv("SUPABASE_URL"),
         os.getenv("SUPABASE_KEY")
     )
+
+def get_sqlite_client():
+    from local_db import LocalClient
+    return LocalClient(os.getenv("TFT_SQLITE_PATH", "tft.sqlite"))
+
+STORAGE_BACKENDS = {
+    'supabase': get_supabase_client,
+    'sqlite': get_sqlite_client
+}
+
+def get_storage_client(backend=None):
+    backend = backend or os.getenv("TFT_STORAGE_BACKEND", "supabase")
+    return STORAGE_BACKENDS[backend]()
@@ -1,6 +1,12 @@
-from models import get_player_matches
+from models import get_player_matches, get_player_aggregates, MATCH_CACHE_TTL, MATCH_CACHE_SIZE
+from aggregates import OVERALL, merge_rows, summarize
 from tft import get_champion_name, ITEM_MAPPING, TRAIT_MAPPING
-from collections import Counter
+from columnar import flatten_matches, game_type_stats, build_stats, active_trait_units
+from filter_dsl import query_boards
+from collections import Counter, OrderedDict
+import metrics
+import threading
+import time
 
 def normalize_placement(placement, game_type):
     if game_type == 'pairs':
@@ -15,97 +21,152 @@ def normalize_placement(placement, game_type):
     
     return placement
 
+GAME_TYPE_KEYS = {
+    'standard': 'ranked',
+    'pairs': 'doubleup'
+}
+
+@metrics.timed('analysis_seconds', stage='game_type_stats')
 def calculate_stats_by_game_type(matches):
-    ranked_matches = [m for m in matches if m['game_type'] == 'standard']
-    doubleup_matches = [m for m in matches if m['game_type'] == 'pairs']
+    stats = game_type_stats(flatten_matches(matches))
+    return {GAME_TYPE_KEYS[game_type]: data for game_type, data in stats.items() if game_type in GAME_TYPE_KEYS}
 
-    stats = {}
+def get_stats_by_game_type(puuid, patch=None):
+    rows = get_player_aggregates(puuid, champion=OVERALL, patch=patch)
+    return {GAME_TYPE_KEYS[game_type]: summarize(aggregate, game_type)
+            for game_type, aggregate in merge_rows(rows, key=lambda row: row['game_type']).items()
+            if game_type in GAME_TYPE_KEYS}
 
-    for game_type, type_matches in [('ranked', ranked_matches), ('doubleup', doubleup_matches)]:
-        if type_matches:
-            normalized_placements = [normalize_placement(m['placement'], m['game_type']) for m in type_matches]
-            
-            avg_placement = sum(normalized_placements) / len(normalized_placements)
-            top4_count = sum(1 for p in normalized_placements if p <= 4)
-            top4_rate = (top4_count / len(normalized_placements)) * 100
-            win_count = sum(1 for p in normalized_placements if p == 1)
-            win_rate = (win_count / len(normalized_placements)) * 100
-            
-            stats[game_type] = {
-                'matches': len(type_matches),
-                'avg_placement': avg_placement,
-                'top4_rate': top4_rate,
-                'win_rate': win_rate,
-                'placements': normalized_placements
-            }
-    
-    return stats
+def clean_unit_items(unit):
+    return [ITEM_MAPPING.get(item, item) for item in unit.item_names]
+
+def build_match_index(user_matches):
+    index = {
+        'matches': user_matches,
+        'units': [],
+        'champion': {},
+        'item': {},
+        'star_level': {},
+        'item_count': {},
+        'game_type': {}
+    }
+
+    for match_idx, match in enumerate(user_matches):
+        for unit in match.units:
+            unit_id = len(index['units'])
+            champion = get_champion_name(unit)
+            unit_items = clean_unit_items(unit)
+            index['units'].append((match_idx, champion, unit_items, unit))
+
+            index['champion'].setdefault(champion, set()).add(unit_id)
+            index['star_level'].setdefault(unit.stars, set()).add(unit_id)
+            index['item_count'].setdefault(len(unit_items), set()).add(unit_id)
+            index['game_type'].setdefault(match.game_type, set()).add(unit_id)
+            # (item, n) lists units holding at least n copies of the item
+            for item, count in Counter(unit_items).items():
+                for n in range(1, count + 1):
+                    index['item'].setdefault((item, n), set()).add(unit_id)
+
+    return index
+
+def query_match_index(index, filters):
+    postings = []
+    if 'champion' in filters:
+        postings.append(index['champion'].get(filters['champion'], set()))
+    for item, count in Counter(filters.get('items', [])).items():
+        postings.append(index['item'].get((item, count), set()))
+    if 'star_level' in filters:
+        postings.append(index['star_level'].get(filters['star_level'], set()))
+    if 'game_type' in filters:
+        postings.append(index['game_type'].get(filters['game_type'], set()))
+
+    min_items = filters.get('min_items', 0)
+    max_items = filters.get('max_items', float('inf'))
+    if postings:
+        postings.sort(key=len)
+        unit_ids = [unit_id for unit_id in postings[0] if all(unit_id in posting for posting in postings[1:])]
+        unit_ids = [unit_id for unit_id in unit_ids if min_items <= len(index['units'][unit_id][2]) <= max_items]
+    else:
+        unit_ids = [unit_id for count, posting in index['item_count'].items() if min_items <= count <= max_items
+                    for unit_id in posting]
 
-def filter_matches(user_matches, filters):
     filtered_matches = []
-    
-    for match in user_matches:
-        if 'game_type' in filters and match['game_type'] != filters['game_type']:
+    matched = set()
+    for unit_id in sorted(unit_ids):
+        match_idx, champion, unit_items, unit = index['units'][unit_id]
+        if match_idx in matched:
             continue
-            
-        match_valid = True
-        
-        for unit in match['units']:
-            champion = get_champion_name(unit)
-            
-            if 'champion' in filters and champion != filters['champion']:
-                continue
-            
-            if 'items' in filters:
-                unit_items = []
-                for item_name in unit.get('itemNames', []):
-                    if len(item_name.split('_')) >= 1:
-                        clean_item = item_name.split('_')[-1]
-                        mapped_item = ITEM_MAPPING.get(clean_item, clean_item)
-                        unit_items.append(mapped_item)
-                if 'min_items' in filters:
-                    min_items = filters['min_items']
-                    if len(unit_items) < min_items:
-                        continue
-                if 'max_items' in filters:
-                    max_items = filters['max_items']
-                    if len(unit_items) > max_items:
-                        continue
-
-                required_items = filters['items']
-                unit_item_counts = Counter(unit_items)
-                required_item_counts = Counter(required_items)
-                
-                if not all(unit_item_counts[item] >= required_item_counts[item] 
-                          for item in required_item_counts):
-                    continue
-            
-            if 'star_level' in filters:
-                unit_stars = unit.get('tier', 1)
-                if unit_stars != filters['star_level']:
-                    continue
-            
-            match_copy = match.copy()
-            match_copy['matched_unit'] = {
-                'champion': champion,
-                'items': unit_items if 'items' in filters else [],
-                'stars': unit.get('tier', 1),
-                'character_id': unit['character_id']
-            }
-            filtered_matches.append(match_copy)
-            break
+        matched.add(match_idx)
+        filtered_matches.append(match_result(index['matches'][match_idx], unit, unit_items if 'items' in filters else []))
     
     return filtered_matches
-    
 
-def explorer_query(puuid, **filters):
+def match_result(board, unit, unit_items):
+    return {
+        'board': board,
+        'match_id': board.match_id,
+        'placement': board.placement,
+        'game_type': board.game_type,
+        'matched_unit': {
+            'champion': get_champion_name(unit),
+            'items': unit_items,
+            'stars': unit.stars,
+            'champion_id': unit.champion
+        } if unit is not None else None
+    }
+
+def query_matches(puuid, query):
+    try:
+        return [match_result(board, unit, clean_unit_items(unit) if unit is not None else [])
+                for board, unit in query_boards(puuid, query)]
+    except ValueError as e:
+        print(f'Invalid query: {e}')
+        return None
+
+@metrics.timed('analysis_seconds', stage='filter_matches')
+def filter_matches(user_matches, filters):
+    return query_match_index(build_match_index(list(user_matches)), filters)
+
+# Same bounds as the match history cache in models.py; an index is reused while the history it was built from is unchanged
+_match_indexes = OrderedDict()
+_match_indexes_lock = threading.Lock()
+
+def history_version(user_matches):
+    # Histories are read in match_id order, so a stored or removed match changes the count or the last ID
+    return len(user_matches), user_matches[-1].match_id if user_matches else None
+
+def get_match_index(puuid):
     user_matches = get_player_matches(puuid)
+    version = history_version(user_matches)
+    with _match_indexes_lock:
+        entry = _match_indexes.get(puuid)
+        if entry is not None and entry[0] >= time.monotonic() and entry[1] == version:
+            _match_indexes.move_to_end(puuid)
+            return entry[2]
+
+    index = build_match_index(user_matches)
+    with _match_indexes_lock:
+        _match_indexes[puuid] = (time.monotonic() + MATCH_CACHE_TTL, version, index)
+        _match_indexes.move_to_end(puuid)
+        while len(_match_indexes) > MATCH_CACHE_SIZE:
+            _match_indexes.popitem(last=False)
+    return index
     
-    if not user_matches:
-        print('No matches found')
-        return
-    
-    filtered_matches = filter_matches(user_matches, filters)
+
+@metrics.timed('analysis_seconds', stage='explorer_query')
+def explorer_query(puuid, query=None, **filters):
+    if query is not None:
+        # Query strings select rows in storage, so the full history is never loaded
+        filtered_matches = query_matches(puuid, query)
+        if filtered_matches is None:
+            return
+    else:
+        index = get_match_index(puuid)
+        if not index['matches']:
+            print('No matches found')
+            return
+
+        filtered_matches = query_match_index(index, filters)
     
     if not filtered_matches:
         print('No matches found with these filters')
@@ -129,8 +190,11 @@ def explorer_query(puuid, **filters):
     print(f'\nMatch details:')
     for i, match in enumerate(filtered_matches, 1):
         unit = match['matched_unit']
-        items_str = ' + '.join(unit['items']) if unit['items'] else 'No items'
         normalized_placement = normalize_placement(match['placement'], match['game_type'])
+        if unit is None:
+            print(f'{i}. {match["match_id"]} ({match["game_type"]}) -> Placement {normalized_placement}')
+            continue
+        items_str = ' + '.join(unit['items']) if unit['items'] else 'No items'
         print(f'{i}. {unit["champion"]} {unit["stars"]}★ ({items_str}) -> Placement {normalized_placement}')
 
     return {
@@ -143,6 +207,7 @@ def explorer_query(puuid, **filters):
         }
     }
 
+@metrics.timed('analysis_seconds', stage='explorer_data')
 def analyze_explorer_data(puuid):  
     user_matches = get_player_matches(puuid)
 
@@ -152,41 +217,28 @@ def analyze_explorer_data(puuid):
     
     print('Explorer data')
 
+    table = flatten_matches(user_matches)
     champion_builds = {}
     all_items = set()
     all_traits = set()
 
-    for match in user_matches:
-        placement = match['placement']
+    for champion, item_names, placements in build_stats(table):
+        items = [ITEM_MAPPING.get(item, item) for item in item_names]
+        all_items.update(items)
 
-        for unit in match['units']:
-            champion = get_champion_name(unit)
+        item_keys = tuple(sorted(items))
+        if champion not in champion_builds:
+            champion_builds[champion] = {}
+
+        if item_keys not in champion_builds[champion]:
+            champion_builds[champion][item_keys] = {'placement': [], 'count': 0}
+
+        champion_builds[champion][item_keys]['placement'].extend(placements)
+        champion_builds[champion][item_keys]['count'] += len(placements)
 
-            items = []
-
-            for item_name in unit.get('itemNames', []):
-                if len(item_name.split('_')) >=3:
-                    clean_item = item_name.split('_')[2]
-                    mapped_item = ITEM_MAPPING.get(clean_item, clean_item)
-                    items.append(mapped_item)
-                    all_items.add(mapped_item)
-
-            item_keys = tuple(sorted(items))
-            if champion not in champion_builds:
-                champion_builds[champion] = {}
-
-            if item_keys not in champion_builds[champion]:
-                champion_builds[champion][item_keys] = {'placement': [], 'count': 0}
-
-            champion_builds[champion][item_keys]['placement'].append(placement)
-            champion_builds[champion][item_keys]['count'] += 1
-        
-        for trait in match['traits']:
-            if trait['tier_current'] >0:
-                clean_trait = trait['name'].split('_')[1]
-                mapped_trait = TRAIT_MAPPING.get(clean_trait, clean_trait)
-                trait_info = f'{trait['num_units']} {mapped_trait}'
-                all_traits.add(trait_info)
+    for trait_name, num_units in active_trait_units(table):
+        mapped_trait = TRAIT_MAPPING.get(trait_name, trait_name)
+        all_traits.add(f'{num_units} {mapped_trait}')
 
     print(f'\nChampion builds')
     for champion, builds in champion_builds.items():
@@ -0,0 +1,43 @@
+from boards import clean_champion_name, clean_trait_name, parse_patch
+
+# Derived per-board features, computed once when a participant is stored so display and
+# filtering read plain indexed columns instead of re-walking units and traits.
+
+# Riot's unit rarity codes; costs are read from Data Dragon only for codes not listed here
+RARITY_COSTS = {0: 1, 1: 2, 2: 3, 4: 4, 6: 5, 8: 6}
+
+
+def patch_number(game_version):
+    patch = parse_patch(game_version)
+    if not patch:
+        return None
+    major, minor = patch.split('.')
+    return int(major) * 100 + int(minor)
+
+
+def unit_cost(unit):
+    cost = RARITY_COSTS.get(unit.get('rarity'))
+    if cost is None:
+        # Imported here because static_data depends on models, which stores these features
+        from static_data import get_champion_costs
+        cost = get_champion_costs().get(clean_champion_name(unit['character_id']), 0)
+    return cost
+
+
+def board_value(units):
+    # A 2-star unit took three copies and a 3-star nine, so star level scales the gold spent
+    return sum(unit_cost(unit) * 3 ** (unit.get('tier', 1) - 1) for unit in units)
+
+
+def active_traits(traits):
+    return {clean_trait_name(trait['name']): trait['tier_current'] for trait in traits if trait['tier_current'] > 0}
+
+
+def participant_features(match_data, participant):
+    return {
+        'board_value': board_value(participant['units']),
+        'item_count': sum(len(unit.get('itemNames', [])) for unit in participant['units']),
+        'active_traits': active_traits(participant['traits']),
+        'last_round': participant.get('last_round'),
+        'patch_number': patch_number(match_data['info'].get('game_version'))
+    }
@@ -0,0 +1,336 @@
+import re
+from collections import Counter
+from boards import TRAITS, clean_trait_name
+from models import iter_player_matches
+from static_data import get_trait_names
+from tft import ITEM_MAPPING, TRAIT_MAPPING
+
+# Small query language for explorer_query, e.g.
+#   champion:Jhin[stars>=2, items:Deathblade+InfinityEdge] AND trait:StarGuardian>=2
+#   AND NOT champion:Ahri AND patch:15.15..15.17 AND placement<=4 AND (level>=9 OR board_value>=60)
+# Top-level AND terms on stored columns are pushed into the participant_boards query; everything
+# else, and trait terms whose pushed filter is only a prefilter, is evaluated on the returned boards.
+# Placements are the raw stored placements.
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(>=|<=|!=|[()\[\],:=<>])|"([^"]*)"|([^\s()\[\],:=<>!"]+))')
+KEYWORDS = {'and', 'or', 'not'}
+OPERATORS = {':': 'eq', '=': 'eq', '!=': 'neq', '>=': 'gte', '<=': 'lte', '>': 'gt', '<': 'lt'}
+COMPARE = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gte': lambda a, b: a >= b,
+    'lte': lambda a, b: a <= b,
+    'gt': lambda a, b: a > b,
+    'lt': lambda a, b: a < b
+}
+
+# Board fields stored as participant_boards columns, with the Board value each is read from
+BOARD_FIELDS = {
+    'placement': lambda board: board.placement,
+    'game_type': lambda board: board.game_type,
+    'level': lambda board: board.level,
+    'gold_left': lambda board: board.gold_left,
+    'board_value': lambda board: board.board_value,
+    'last_round': lambda board: board.last_round,
+    'item_count': lambda board: sum(len(unit.items) for unit in board.units),
+    'patch': lambda board: board.patch_number
+}
+COLUMNS = {'patch': 'patch_number'}
+
+
+def normalize(name):
+    return re.sub(r"[\s'.]", '', name).lower()
+
+ITEM_NAMES = {normalize(raw): normalize(mapped) for raw, mapped in ITEM_MAPPING.items()}
+TRAIT_NAMES = {normalize(raw): normalize(mapped) for raw, mapped in TRAIT_MAPPING.items()}
+
+def item_key(name):
+    key = normalize(name)
+    return ITEM_NAMES.get(key, key)
+
+def trait_key(name):
+    key = normalize(name)
+    return TRAIT_NAMES.get(key, key)
+
+def find_trait(key, names):
+    return next((name for name in names if trait_key(name) == key), None)
+
+def canonical_trait(name):
+    # active_traits is keyed by the clean Riot name (StarGuardian), matched here the way trait_key matches in memory
+    key = trait_key(name)
+    return (find_trait(key, list(TRAITS.names)) or find_trait(key, TRAIT_MAPPING)
+            or find_trait(key, {clean_trait_name(trait_id) for trait_id in get_trait_names() if '_' in trait_id}))
+
+
+def parse_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Expected a number, got {value!r}')
+
+def parse_patch_number(value):
+    match = re.fullmatch(r'(\d+)\.(\d+)', value)
+    if not match:
+        raise ValueError(f'Expected a patch like 15.17, got {value!r}')
+    return int(match.group(1)) * 100 + int(match.group(2))
+
+
+class And:
+    def __init__(self, children):
+        self.children = children
+
+    def matches(self, board):
+        return all(child.matches(board) for child in self.children)
+
+
+class Or:
+    def __init__(self, children):
+        self.children = children
+
+    def matches(self, board):
+        return any(child.matches(board) for child in self.children)
+
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+    def matches(self, board):
+        return not self.child.matches(board)
+
+
+class Compare:
+    def __init__(self, field, operator, value):
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def matches(self, board):
+        value = BOARD_FIELDS[self.field](board)
+        return value is not None and COMPARE[self.operator](value, self.value)
+
+    def pushdown(self):
+        return [(self.operator, COLUMNS.get(self.field, self.field), self.value)]
+
+
+class Champion:
+    def __init__(self, name, conditions):
+        self.name = normalize(name)
+        self.conditions = conditions
+
+    def unit_matches(self, unit):
+        if normalize(unit.champion_name) != self.name:
+            return False
+        for kind, operator, value in self.conditions:
+            if kind == 'items':
+                held = Counter(item_key(item) for item in unit.item_names)
+                if any(held[item] < count for item, count in value.items()):
+                    return False
+            elif not COMPARE[operator](unit.stars if kind == 'stars' else len(unit.items), value):
+                return False
+        return True
+
+    def matched_unit(self, board):
+        return next((unit for unit in board.units if self.unit_matches(unit)), None)
+
+    def matches(self, board):
+        return self.matched_unit(board) is not None
+
+
+class Item:
+    def __init__(self, name):
+        self.name = item_key(name)
+
+    def matches(self, board):
+        return any(item_key(item) == self.name for unit in board.units for item in unit.item_names)
+
+
+class Trait:
+    # PostgREST compares active_traits->>name as text, so storage only narrows the boards down
+    recheck = True
+
+    def __init__(self, name, operator='gte', tier=1):
+        self.name = trait_key(name)
+        self.typed_name = name
+        self.operator = operator
+        self.tier = tier
+
+    def matches(self, board):
+        tier = next((trait.tier for trait in board.traits if trait_key(trait.name) == self.name), 0)
+        return COMPARE[self.operator](tier, self.tier)
+
+    def pushdown(self):
+        # Only conditions that exclude inactive traits can be pushed: a missing key filters the row out.
+        # Names that resolve to no known trait are evaluated in memory instead.
+        if self.operator not in ('gte', 'gt', 'eq') or self.tier <= 0:
+            return None
+        name = canonical_trait(self.typed_name)
+        if name is None:
+            return None
+        if self.operator == 'eq':
+            # Containment is what the GIN index on active_traits serves
+            return [('contains', 'active_traits', {name: self.tier})]
+        if self.tier > 9:
+            # Stored tiers are single digits, which compare as text below any longer bound ('2' >= '10')
+            return None
+        return [(self.operator, f'active_traits->>{name}', self.tier)]
+
+
+class Parser:
+    def __init__(self, query):
+        self.tokens = []
+        position = 0
+        query = query.strip()
+        while position < len(query):
+            match = TOKEN_PATTERN.match(query, position)
+            if not match or match.end() == position:
+                raise ValueError(f'Unexpected character at {position}: {query[position:]!r}')
+            symbol, quoted, word = match.groups()
+            if symbol:
+                self.tokens.append(('symbol', symbol))
+            elif quoted is not None:
+                self.tokens.append(('word', quoted))
+            elif word.lower() in KEYWORDS:
+                self.tokens.append(('keyword', word.lower()))
+            else:
+                self.tokens.append(('word', word))
+            position = match.end()
+        self.position = 0
+
+    def peek(self, kind=None, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            return None
+        return token
+
+    def take(self, kind=None, value=None):
+        token = self.peek(kind, value)
+        if token is None:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else 'end of query'
+            raise ValueError(f'Expected {value or kind}, found {found!r}')
+        self.position += 1
+        return token[1]
+
+    def operator(self):
+        symbol = self.take('symbol')
+        if symbol not in OPERATORS:
+            raise ValueError(f'Expected a comparison, found {symbol!r}')
+        return OPERATORS[symbol]
+
+    def parse(self):
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f'Unexpected {self.tokens[self.position][1]!r}')
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek('keyword', 'or'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek('keyword', 'and'):
+            self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek('keyword', 'not'):
+            self.take()
+            return Not(self.parse_not())
+        if self.peek('symbol', '('):
+            self.take()
+            node = self.parse_or()
+            self.take('symbol', ')')
+            return node
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        field = self.take('word').lower()
+        if field == 'champion':
+            self.take('symbol', ':')
+            return Champion(self.take('word'), self.parse_unit_conditions())
+        if field == 'item':
+            self.take('symbol', ':')
+            return Item(self.take('word'))
+        if field == 'trait':
+            self.take('symbol', ':')
+            name = self.take('word')
+            if self.peek('symbol') and self.peek()[1] in OPERATORS:
+                return Trait(name, self.operator(), parse_number(self.take('word')))
+            return Trait(name)
+        if field in BOARD_FIELDS:
+            return self.parse_compare(field)
+        raise ValueError(f'Unknown field {field!r}')
+
+    def parse_compare(self, field):
+        operator = self.operator()
+        value = self.take('word')
+        convert = str if field == 'game_type' else parse_patch_number if field == 'patch' else parse_number
+        if '..' in value:
+            if operator != 'eq':
+                raise ValueError(f'Ranges only work with ":", as in {field}:1..4')
+            low, high = value.split('..')
+            return And([Compare(field, 'gte', convert(low)), Compare(field, 'lte', convert(high))])
+        return Compare(field, operator, convert(value))
+
+    def parse_unit_conditions(self):
+        conditions = []
+        if not self.peek('symbol', '['):
+            return conditions
+        self.take()
+        while True:
+            kind = self.take('word').lower()
+            operator = self.operator()
+            if kind == 'items':
+                conditions.append((kind, operator, Counter(item_key(item) for item in self.take('word').split('+'))))
+            elif kind in ('stars', 'item_count'):
+                conditions.append((kind, operator, parse_number(self.take('word'))))
+            else:
+                raise ValueError(f'Unknown unit condition {kind!r}')
+            if self.peek('symbol', ']'):
+                self.take()
+                return conditions
+            self.take('symbol', ',')
+
+
+def parse_query(query):
+    return Parser(query).parse()
+
+
+def conjuncts(node):
+    if isinstance(node, And):
+        return [term for child in node.children for term in conjuncts(child)]
+    return [node]
+
+
+def plan_query(node):
+    filters = []
+    residual = []
+    for term in conjuncts(node):
+        pushed = term.pushdown() if hasattr(term, 'pushdown') else None
+        if pushed is None or getattr(term, 'recheck', False):
+            residual.append(term)
+        if pushed is not None:
+            filters.extend(pushed)
+    return filters, And(residual) if residual else None
+
+
+def matched_unit(node, board):
+    for term in conjuncts(node):
+        if isinstance(term, Champion):
+            return term.matched_unit(board)
+    return None
+
+
+def query_boards(puuid, query):
+    node = parse_query(query)
+    filters, residual = plan_query(node)
+    for board in iter_player_matches(puuid, filters=filters):
+        if residual is None or residual.matches(board):
+            yield board, matched_unit(node, board)
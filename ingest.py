@@ -0,0 +1,204 @@
+from riot_api import API_KEY, TARGET_SET, SET_START_TIMES, get_puuid, get_matchid, get_match_info, resolve_region
+from models import (add_player, get_player, get_players, get_player_match_ids, get_skipped_match_ids, store_matches, get_archive,
+                    store_participant_relations_bulk, store_skipped_matches, get_ingest_cursor, save_ingest_cursor, chunked)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+
+
+def get_known_match_ids(puuid, match_ids):
+    # Known means related to this player: a match stored without the player's relation still has to be ingested
+    if not match_ids:
+        return set()
+    return get_player_match_ids(puuid, match_ids) | get_skipped_match_ids(match_ids, TARGET_SET)
+
+
+def list_new_match_ids(puuid, last_match_id=None, max_matches=200, batch_size=25, region=None):
+    new_match_ids = []
+    newest_match_id = None
+    for start_idx in range(0, max_matches, batch_size):
+        current_batch_size = min(batch_size, max_matches - start_idx)
+        print(f"Listing matches {start_idx}-{start_idx + current_batch_size - 1}")
+
+        match_ids = get_matchid(puuid, start_idx, current_batch_size, API_KEY, SET_START_TIMES.get(TARGET_SET), region)
+        if match_ids is None:
+            # Listing failed partway: no newest ID is returned, so the cursor stays put and the range is listed again
+            return new_match_ids, None
+        if not match_ids:
+            break
+        newest_match_id = newest_match_id or match_ids[0]
+
+        # IDs come newest first, so everything after the last seen match is already handled
+        reached_cursor = last_match_id in match_ids
+        if reached_cursor:
+            match_ids = match_ids[:match_ids.index(last_match_id)]
+
+        existing_ids = get_known_match_ids(puuid, match_ids)
+        batch_new_ids = [mid for mid in match_ids if mid not in existing_ids]
+        new_match_ids.extend(batch_new_ids)
+
+        if reached_cursor or not batch_new_ids:
+            break
+    return new_match_ids, newest_match_id
+
+
+@metrics.timed('ingest_stage_seconds', stage='plan')
+def plan_player_ingest(puuid, max_matches=200, batch_size=25, region=None):
+    cursor = get_ingest_cursor(puuid) or {}
+    new_match_ids, newest_match_id = list_new_match_ids(puuid, cursor.get('last_match_id'), max_matches, batch_size,
+                                                        region)
+
+    pending_ids = list(dict.fromkeys((cursor.get('pending_match_ids') or []) + new_match_ids))
+    if pending_ids:
+        existing_ids = get_known_match_ids(puuid, pending_ids)
+        pending_ids = [mid for mid in pending_ids if mid not in existing_ids]
+
+    save_ingest_cursor(puuid,
+                       last_match_id=newest_match_id or cursor.get('last_match_id'),
+                       pending_match_ids=pending_ids)
+    print(f'{len(pending_ids)} matches to ingest ({len(new_match_ids)} new since last run)')
+    return pending_ids
+
+
+def ingest_matches(match_ids):
+    skipped = {}
+    # Matches already archived (stored earlier without this relation, or by a lobby mate) are not downloaded again
+    archived = get_archive().get_many(match_ids)
+    with metrics.timed('ingest_stage_seconds', stage='fetch'):
+        match_data = list(archived.values()) + get_match_info([mid for mid in match_ids if mid not in archived], API_KEY,
+                                                              skipped=skipped)
+    if skipped:
+        store_skipped_matches(skipped)
+    metrics.increment('ingest_matches_total', len(skipped), outcome='skipped')
+    if match_data:
+        with metrics.timed('ingest_stage_seconds', stage='store_matches'):
+            stored_ids = set(store_matches(match_data))
+        # Relations are only written for matches whose row landed, since a relation marks the match as known
+        match_data = [match for match in match_data if match['metadata']['match_id'] in stored_ids]
+        with metrics.timed('ingest_stage_seconds', stage='store_relations'):
+            relations_stored = bool(match_data) and store_participant_relations_bulk(match_data)
+        if not relations_stored:
+            match_data = []
+
+    done = {mid: None for mid in skipped}
+    done.update((match['metadata']['match_id'], match['info'].get('game_datetime')) for match in match_data)
+    metrics.increment('ingest_matches_total', len(match_data), outcome='stored')
+    metrics.increment('ingest_matches_total', len(match_ids) - len(done), outcome='failed')
+    return done
+
+
+def finish_player_ingest(puuid, pending_ids, done):
+    remaining_ids = [mid for mid in pending_ids if mid not in done]
+    game_datetimes = [done[mid] for mid in pending_ids if done.get(mid)]
+    fields = {'pending_match_ids': remaining_ids}
+    if game_datetimes:
+        fields['last_game_datetime'] = max(game_datetimes)
+    save_ingest_cursor(puuid, **fields)
+    return remaining_ids
+
+
+def stored_region(puuid):
+    # Callers that give no region use the one stored for the player instead of moving them to the default cluster
+    player = get_player(puuid)
+    return resolve_region(player['region'] if player else None)
+
+
+def update_player_data(username, tag, max_matches=200, batch_size=25, delay_between_batches=0, region=None):
+    try:
+        lookup_region = resolve_region(region)
+    except ValueError as e:
+        print(f'Could not update {username}#{tag}: {e}')
+        return None
+    puuid = get_puuid(username, tag, API_KEY, lookup_region)
+    if not puuid:
+        print(f'Could not get PUUID')
+        return None
+    
+    add_player(username, tag, puuid, lookup_region if region else None)
+    try:
+        region = lookup_region if region else stored_region(puuid)
+    except ValueError as e:
+        print(f'Could not update {username}#{tag}: {e}')
+        return None
+    pending_ids = plan_player_ingest(puuid, max_matches, batch_size, region)
+    done = {}
+
+    for batch_number, batch_ids in enumerate(chunked(pending_ids, batch_size), 1):
+        print(f"\nBatch {batch_number}: Fetching {len(batch_ids)} matches")
+        with metrics.timed('ingest_batch_seconds'):
+            batch_done = ingest_matches(batch_ids)
+            done.update(batch_done)
+            # Checkpoint after every batch so a crash only loses the batch in flight
+            finish_player_ingest(puuid, pending_ids, done)
+        print(f'Batch {batch_number} complete ({len(batch_done)} of {len(batch_ids)} handled)')
+
+        if batch_number * batch_size < len(pending_ids) and delay_between_batches:
+            print(f'Waiting {delay_between_batches}s')
+            metrics.sleep(delay_between_batches, 'batch_delay')
+
+    total_new_matches = sum(1 for game_datetime in done.values() if game_datetime is not None)
+    print(f'\nAdded {total_new_matches} new matches total.')
+    metrics.export()
+    return puuid
+
+
+def resolve_player(player, region):
+    if player.get('puuid'):
+        return player['puuid']
+    puuid = get_puuid(player['username'], player['tag'], API_KEY, region)
+    if puuid:
+        add_player(player['username'], player['tag'], puuid, region if player.get('region') else None)
+    return puuid
+
+
+def plan_player(player, max_matches, batch_size):
+    try:
+        region = resolve_region(player.get('region'))
+        puuid = resolve_player(player, region)
+        if puuid and not player.get('region'):
+            region = stored_region(puuid)
+    except ValueError as e:
+        print(f"Skipping {player['username']}#{player['tag']}: {e}")
+        return None, []
+    if not puuid:
+        print(f"Could not get PUUID for {player['username']}#{player['tag']}")
+        return None, []
+    return puuid, plan_player_ingest(puuid, max_matches, batch_size, region)
+
+
+def update_players(players=None, max_matches=200, batch_size=25, max_workers=8):
+    if players is None:
+        players = get_players()
+    players = [player if isinstance(player, dict) else dict(zip(('username', 'tag', 'region'), player)) for player in players]
+
+    claimed_ids = set()
+    pending_by_player = {}
+    ingest_futures = []
+
+    # Listing runs per player; each newly seen match is fetched and stored exactly once, whichever lobby member lists it first
+    with ThreadPoolExecutor(max_workers=max_workers) as list_executor, \
+            ThreadPoolExecutor(max_workers=2) as ingest_executor:
+        list_futures = [list_executor.submit(plan_player, player, max_matches, batch_size) for player in players]
+
+        for future in as_completed(list_futures):
+            puuid, pending_ids = future.result()
+            if not puuid:
+                continue
+            pending_by_player[puuid] = pending_ids
+
+            unclaimed_ids = [mid for mid in pending_ids if mid not in claimed_ids]
+            claimed_ids.update(unclaimed_ids)
+
+            for chunk in chunked(unclaimed_ids, batch_size):
+                ingest_futures.append(ingest_executor.submit(ingest_matches, chunk))
+
+        done = {}
+        for future in ingest_futures:
+            done.update(future.result())
+
+    for puuid, pending_ids in pending_by_player.items():
+        finish_player_ingest(puuid, pending_ids, done)
+
+    total_new_matches = sum(1 for game_datetime in done.values() if game_datetime is not None)
+    print(f'\nAdded {total_new_matches} new matches total for {len(pending_by_player)} players.')
+    metrics.export()
+    return list(pending_by_player)
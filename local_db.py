@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+# SQLite has no "add column if not exists", so these statements are applied by hand
+ADD_COLUMN_PATTERN = re.compile(r'alter table (\w+) add column if not exists (\w+) ([^;]+);', re.IGNORECASE)
+# SQLite only has b-tree indexes, so Postgres index methods such as gin are left out
+INDEX_METHOD_PATTERN = re.compile(r'create index [^;]* using \w+ [^;]*;', re.IGNORECASE)
+
+# Embedded stand-in for the Supabase client: implements the subset of the PostgREST
+# query builder used by models.py on top of SQLite, with the tables from schema.sql.
+
+def json_path(key):
+    # Keys are bound as a parameter; a quote would end the quoted label, so such keys are refused
+    if '"' in key:
+        raise ValueError(f'Unsupported JSON key {key!r}')
+    return f'$."{key}"'
+
+
+class QueryResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class LocalClient:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('pragma journal_mode = wal')
+        self.connection.execute('pragma synchronous = normal')
+        with open(SCHEMA_PATH) as f:
+            self.apply_schema(f.read())
+        self.load_columns()
+
+    def apply_schema(self, schema):
+        # Statements run in order, so indexes after an added column see it
+        parts = ADD_COLUMN_PATTERN.split(INDEX_METHOD_PATTERN.sub('', schema))
+        self.connection.executescript(parts[0])
+        for i in range(1, len(parts), 4):
+            table, column, definition, script = parts[i:i + 4]
+            existing = {row['name'] for row in self.connection.execute(f'pragma table_info("{table}")')}
+            if column not in existing:
+                self.connection.execute(f'alter table "{table}" add column "{column}" {definition}')
+            self.connection.executescript(script)
+
+    def load_columns(self):
+        self.json_columns = {}
+        self.primary_keys = {}
+        tables = self.connection.execute("select name from sqlite_master where type = 'table'").fetchall()
+        for (table,) in tables:
+            info = self.connection.execute(f'pragma table_info("{table}")').fetchall()
+            self.json_columns[table] = {row['name'] for row in info if row['type'].lower() == 'jsonb'}
+            self.primary_keys[table] = [row['name'] for row in sorted(info, key=lambda r: r['pk']) if row['pk']]
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def sql(self, query, params=()):
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(query, params).fetchall()]
+
+
+class LocalQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.name = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.rows = []
+        self.values = {}
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.params = []
+        self.ordering = []
+        self.limit_count = None
+        self.offset_count = None
+
+    def select(self, columns='*'):
+        self.operation = 'select'
+        self.columns = columns
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.operation = 'upsert'
+        self.rows = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def insert(self, rows):
+        self.operation = 'insert'
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values):
+        self.operation = 'update'
+        self.values = values
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def where(self, clause, *params):
+        self.filters.append(clause)
+        self.params.extend(params)
+        return self
+
+    def column_sql(self, column):
+        # PostgREST addresses JSON keys as column->key or column->>key; the key is bound as a JSON path
+        if '->' in column:
+            column, key = re.split(r'->>?', column, maxsplit=1)
+            return f'json_extract("{column}", ?)', [json_path(key)]
+        return f'"{column}"', []
+
+    def compare(self, column, operator, value):
+        column_sql, params = self.column_sql(column)
+        return self.where(f'{column_sql} {operator} ?', *params, value)
+
+    def eq(self, column, value):
+        return self.compare(column, '=', value)
+
+    def neq(self, column, value):
+        return self.compare(column, '!=', value)
+
+    def gt(self, column, value):
+        return self.compare(column, '>', value)
+
+    def gte(self, column, value):
+        return self.compare(column, '>=', value)
+
+    def lt(self, column, value):
+        return self.compare(column, '<', value)
+
+    def lte(self, column, value):
+        return self.compare(column, '<=', value)
+
+    def contains(self, column, value):
+        # jsonb @> for objects: every key holds the given value
+        for key, item in value.items():
+            self.where(f'json_extract("{column}", ?) = ?', json_path(key), item)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        return self.where(f'"{column}" in ({", ".join("?" * len(values))})', *values)
+
+    def is_(self, column, value):
+        return self.where(f'"{column}" is null' if value in (None, 'null') else f'"{column}" is not null')
+
+    def order(self, column, desc=False):
+        self.ordering.append(f'"{column}" {"desc" if desc else "asc"}')
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def range(self, start, end):
+        self.offset_count = start
+        self.limit_count = end - start + 1
+        return self
+
+    def encode(self, column, value):
+        if column in self.client.json_columns.get(self.name, ()) and value is not None:
+            return json.dumps(value)
+        return value
+
+    def decode(self, row):
+        json_columns = self.client.json_columns.get(self.name, ())
+        return {key: json.loads(value) if key in json_columns and value is not None else value
+                for key, value in dict(row).items()}
+
+    def where_sql(self):
+        return f' where {" and ".join(self.filters)}' if self.filters else ''
+
+    def execute(self):
+        with self.client.lock:
+            return QueryResult(getattr(self, f'execute_{self.operation}')())
+
+    def execute_select(self):
+        columns = '*' if self.columns.strip() == '*' else ', '.join(
+            f'"{column.strip()}"' for column in self.columns.split(','))
+        query = f'select {columns} from "{self.name}"{self.where_sql()}'
+        if self.ordering:
+            query += f' order by {", ".join(self.ordering)}'
+        if self.limit_count is not None or self.offset_count is not None:
+            query += f' limit {self.limit_count if self.limit_count is not None else -1}'
+            query += f' offset {self.offset_count or 0}'
+        return [self.decode(row) for row in self.client.connection.execute(query, self.params)]
+
+    def write_rows(self, conflict_clause):
+        if not self.rows:
+            return []
+        columns = list(self.rows[0])
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        query = (f'insert into "{self.name}" ({column_list}) '
+                 f'values ({", ".join("?" * len(columns))}){conflict_clause}')
+        values = [[self.encode(column, row.get(column)) for column in columns] for row in self.rows]
+        connection = self.client.connection
+        connection.execute('begin')
+        try:
+            connection.executemany(query, values)
+            connection.execute('commit')
+        except Exception:
+            connection.execute('rollback')
+            raise
+        return self.rows
+
+    def execute_insert(self):
+        return self.write_rows('')
+
+    def execute_upsert(self):
+        if not self.rows:
+            return []
+        keys = [key.strip() for key in self.on_conflict.split(',')] if self.on_conflict else self.client.primary_keys[self.name]
+        updates = [column for column in self.rows[0] if column not in keys]
+        target = ', '.join(f'"{key}"' for key in keys)
+        if self.ignore_duplicates or not updates:
+            return self.write_rows(f' on conflict ({target}) do nothing')
+        assignments = ', '.join(f'"{column}" = excluded."{column}"' for column in updates)
+        return self.write_rows(f' on conflict ({target}) do update set {assignments}')
+
+    def execute_update(self):
+        columns = list(self.values)
+        assignments = ', '.join(f'"{column}" = ?' for column in columns)
+        values = [self.encode(column, self.values[column]) for column in columns]
+        self.client.connection.execute(f'update "{self.name}" set {assignments}{self.where_sql()}', values + self.params)
+        return [self.values]
+
+    def execute_delete(self):
+        self.client.connection.execute(f'delete from "{self.name}"{self.where_sql()}', self.params)
+        return []
@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+from aggregates import empty_aggregate, add_placement, merge_aggregate, summarize
+from archive import MatchArchive
+from boards import clean_champion_name, clean_item_name, clean_trait_name, parse_patch
+from models import iter_match_ids, get_raw_matches, chunked
+
+# Meta statistics over every participant of every stored match, not just tracked players.
+# Match IDs are split into shards; each worker process reads its shard from the archive and
+# returns partial aggregates, which are merged in the parent.
+
+SHARD_SIZE = 200
+SECTIONS = ('champions', 'builds', 'traits')
+
+_worker_archive = None
+
+
+def empty_partial():
+    return {section: {} for section in SECTIONS}
+
+
+def count(section, key, placement):
+    aggregate = section.get(key)
+    if aggregate is None:
+        aggregate = section[key] = empty_aggregate()
+    add_placement(aggregate, placement)
+
+
+def aggregate_matches(matches, partial=None):
+    partial = partial or empty_partial()
+    champions, builds, traits = (partial[section] for section in SECTIONS)
+
+    for match_data in matches:
+        patch = parse_patch(match_data['info'].get('game_version')) or 'unknown'
+        game_type = match_data['info']['tft_game_type']
+        for participant in match_data['info']['participants']:
+            placement = participant['placement']
+            for unit in participant['units']:
+                champion = clean_champion_name(unit['character_id'])
+                items = tuple(sorted(clean_item_name(item) for item in unit.get('itemNames', [])))
+                count(champions, (patch, game_type, champion), placement)
+                count(builds, (patch, game_type, champion, items), placement)
+            for trait in participant['traits']:
+                if trait['tier_current'] > 0:
+                    count(traits, (patch, game_type, clean_trait_name(trait['name']), trait['tier_current']), placement)
+    return partial
+
+
+def merge_partials(target, partial):
+    for section in SECTIONS:
+        merged = target[section]
+        for key, aggregate in partial[section].items():
+            if key in merged:
+                merge_aggregate(merged[key], aggregate)
+            else:
+                merged[key] = aggregate
+    return target
+
+
+def aggregate_shard(match_ids):
+    global _worker_archive
+    if _worker_archive is None:
+        _worker_archive = MatchArchive()
+    matches = _worker_archive.get_many(match_ids)
+    missing_ids = [match_id for match_id in match_ids if match_id not in matches]
+    return aggregate_matches(matches.values()), missing_ids
+
+
+def run_meta_analysis(max_workers=None, shard_size=SHARD_SIZE):
+    result = empty_partial()
+    missing_ids = []
+    shards = chunked(iter_match_ids(), shard_size)
+    # A single worker aggregates in-process rather than paying for pickling partials across processes
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 1 else None
+    try:
+        for partial, shard_missing_ids in (executor.map if executor else map)(aggregate_shard, shards):
+            merge_partials(result, partial)
+            missing_ids.extend(shard_missing_ids)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # Matches only held in matches.raw_data are read (and archived) by the parent
+    for match_ids in chunked(missing_ids, shard_size):
+        aggregate_matches(get_raw_matches(match_ids).values(), result)
+    return result
+
+
+KEY_FIELDS = {
+    'champions': ('patch', 'game_type', 'champion'),
+    'builds': ('patch', 'game_type', 'champion', 'items'),
+    'traits': ('patch', 'game_type', 'trait', 'tier')
+}
+
+
+def patch_order(patch):
+    return tuple(int(part) for part in patch.split('.')) if patch != 'unknown' else ()
+
+
+def latest_patch(result):
+    return max((key[0] for key in result['champions']), key=patch_order, default=None)
+
+
+def meta_rows(result, section, patch=None, game_type=None, min_games=1):
+    rows = []
+    for key, aggregate in result[section].items():
+        if patch is not None and key[0] != patch:
+            continue
+        if game_type is not None and key[1] != game_type:
+            continue
+        if aggregate['games'] >= min_games:
+            # Double Up placements are paired before summarizing, like every other aggregate read
+            rows.append({**dict(zip(KEY_FIELDS[section], key)), **summarize(aggregate, key[1])})
+    return sorted(rows, key=lambda row: row['avg_placement'])
+
+
+def display_meta(result, patch=None, game_type='standard', min_games=20, top=15):
+    from tft import ITEM_MAPPING, TRAIT_MAPPING
+
+    patch = patch or latest_patch(result)
+    if patch is None:
+        print('No matches stored')
+        return
+    print(f'Meta for patch {patch} ({game_type})')
+
+    print(f'\n{"Champion":<15} {"Games":<7} {"Avg Place":<10} {"Top 4%":<8} {"Win %":<8}')
+    print('-' * 55)
+    for row in meta_rows(result, 'champions', patch, game_type, min_games)[:top]:
+        print(f'{row["champion"]:<15} {row["games"]:<7} {row["avg_placement"]:<10.2f} '
+              f'{row["top4_rate"]:<8.1f}% {row["win_rate"]:<8.1f}%')
+
+    print('\nBest builds')
+    for row in meta_rows(result, 'builds', patch, game_type, min_games)[:top]:
+        items = ' + '.join(ITEM_MAPPING.get(item, item) for item in row['items']) or 'No items'
+        print(f'{row["champion"]} ({items}): {row["avg_placement"]:.2f} avg over {row["games"]} games')
+
+    print('\nBest traits')
+    for row in meta_rows(result, 'traits', patch, game_type, min_games)[:top]:
+        print(f'{TRAIT_MAPPING.get(row["trait"], row["trait"])} tier {row["tier"]}: '
+              f'{row["avg_placement"]:.2f} avg over {row["games"]} games')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Champion, build and trait stats across every stored participant')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--patch', help='major.minor, defaults to the latest stored patch')
+    parser.add_argument('--game-type', default='standard')
+    parser.add_argument('--min-games', type=int, default=20)
+    args = parser.parse_args()
+
+    display_meta(run_meta_analysis(args.workers), args.patch, args.game_type, args.min_games)
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process counters and latency histograms, keyed by metric name and label values.
+# Exporters are picked with TFT_METRICS, e.g. "log,prometheus=metrics.prom,json=metrics.json".
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative_counts(self):
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'count': histogram.count,
+                                'sum': histogram.sum, 'buckets': dict(zip(histogram.buckets, histogram.cumulative_counts()))}
+                               for (name, labels), histogram in sorted(self.histograms.items())]
+            }
+
+
+registry = MetricsRegistry()
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+@contextmanager
+def timed(name, **labels):
+    # Also usable as a decorator: @timed('analysis_seconds', stage='explorer')
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start, **labels)
+
+def sleep(seconds, reason):
+    if seconds > 0:
+        time.sleep(seconds)
+        registry.observe('sleep_seconds', seconds, reason=reason)
+
+
+def format_labels(labels, extra=None):
+    labels = dict(labels, **(extra or {}))
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+def prometheus_text(snapshot):
+    lines = []
+    for counter in snapshot['counters']:
+        lines.append(f"tft_{counter['name']}{format_labels(counter['labels'])} {counter['value']}")
+    for histogram in snapshot['histograms']:
+        name = f"tft_{histogram['name']}"
+        for bound, count in histogram['buckets'].items():
+            lines.append(f"{name}_bucket{format_labels(histogram['labels'], {'le': bound})} {count}")
+        lines.append(f"{name}_bucket{format_labels(histogram['labels'], {'le': '+Inf'})} {histogram['count']}")
+        lines.append(f"{name}_sum{format_labels(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{name}_count{format_labels(histogram['labels'])} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def log_exporter(snapshot):
+    for counter in snapshot['counters']:
+        print(f"{counter['name']}{format_labels(counter['labels'])}: {counter['value']}")
+    for histogram in snapshot['histograms']:
+        average = histogram['sum'] / histogram['count'] if histogram['count'] else 0
+        print(f"{histogram['name']}{format_labels(histogram['labels'])}: "
+              f"{histogram['count']} calls, {histogram['sum']:.3f}s total, {average * 1000:.1f}ms avg")
+
+def file_writer(path, render):
+    def export(snapshot):
+        # Written to a temporary file first so scrapers never read a half-written file
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(render(snapshot))
+        os.replace(temp_path, path)
+    return export
+
+def prometheus_exporter(path='metrics.prom'):
+    return file_writer(path, prometheus_text)
+
+def json_exporter(path='metrics.json'):
+    return file_writer(path, lambda snapshot: json.dumps(snapshot, indent=2))
+
+EXPORTERS = {
+    'log': lambda path=None: log_exporter,
+    'prometheus': prometheus_exporter,
+    'json': json_exporter
+}
+
+def parse_exporters(spec):
+    exporters = []
+    for part in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, path = part.partition('=')
+        exporters.append(EXPORTERS[kind](path) if path else EXPORTERS[kind]())
+    return exporters
+
+exporters = parse_exporters(os.getenv('TFT_METRICS', ''))
+
+def add_exporter(exporter):
+    exporters.append(exporter)
+
+def export():
+    if not exporters:
+        return
+    snapshot = registry.snapshot()
+    for exporter in exporters:
+        try:
+            exporter(snapshot)
+        except Exception as e:
+            print(f'Error exporting metrics: {e}')
@@ -1,118 +1,591 @@
-from db import get_supabase_client
+from db import get_storage_client
+from archive import MatchArchive
+from boards import parse_board, parse_patch
+from aggregates import OVERALL, aggregate_boards, board_entry, merge_aggregate, empty_aggregate
+from features import participant_features
+from collections import OrderedDict
+import os
+import metrics
+import threading
+import time
 
-supabase = get_supabase_client()
+supabase = get_storage_client()
 
-def add_player(username, tag, puuid):
+def execute(query, table, operation):
+    with metrics.timed('db_query_seconds', table=table, operation=operation):
+        try:
+            result = query.execute()
+        except Exception:
+            metrics.increment('db_errors_total', table=table, operation=operation)
+            raise
+    metrics.increment('db_rows_total', len(result.data or []), table=table, operation=operation)
+    return result
+
+def add_player(username, tag, puuid, region=None):
     try:
-        supabase.table('players').upsert({
+        player = {
             'puuid': puuid,
             'username': username,
             'tag': tag
-        }).execute()
+        }
+        # Left out when unknown so re-adding a player never clears the region stored for them
+        if region is not None:
+            player['region'] = region
+        execute(supabase.table('players').upsert(player), 'players', 'upsert')
+        invalidate_tracked_players()
         print(f'Player {username}#{tag} added')
         return True
     except Exception as e:
         print(f'Error adding player: {e}')
         return False
     
-def get_existing_match_ids():
+def get_player(puuid):
     try:
-        result = supabase.table('matches').select('match_id').execute()
-        return {match['match_id'] for match in result.data}
+        result = execute(supabase.table('players').select('puuid, username, tag, region').eq('puuid', puuid), 'players', 'select')
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f'Error fetching player: {e}')
+        return None
+
+def get_players():
+    try:
+        result = execute(supabase.table('players').select('puuid, username, tag, region'), 'players', 'select')
+        return result.data
+    except Exception as e:
+        print(f'Error fetching players: {e}')
+        return []
+
+def get_existing_match_ids(match_ids, chunk_size=100):
+    existing_ids = set()
+    try:
+        match_ids = list(match_ids)
+        for i in range(0, len(match_ids), chunk_size):
+            result = execute(supabase.table('matches').select('match_id').in_('match_id', match_ids[i:i + chunk_size]), 'matches', 'select')
+            existing_ids.update(match['match_id'] for match in result.data)
+        return existing_ids
     except Exception as e:
         print(f'Error fetching match IDs: {e}')
-        return set()
+        return existing_ids
     
-def store_match(match_data):
+def get_player_match_ids(puuid, match_ids, chunk_size=100):
+    related_ids = set()
     try:
-        match_id = match_data['metadata']['match_id']
-        game_type = match_data['info']['tft_game_type']
-        set_number = match_data['info'].get('tft_set_number', 'unknown')
-        patch_version = match_data['info'].get('game_version', 'unknown')
+        for chunk in chunked(list(match_ids), chunk_size):
+            query = supabase.table('player_matches').select('match_id').eq('puuid', puuid).in_('match_id', chunk)
+            result = execute(query, 'player_matches', 'select')
+            related_ids.update(row['match_id'] for row in result.data)
+        return related_ids
+    except Exception as e:
+        print(f'Error fetching player match IDs: {e}')
+        return related_ids
+
+# raw_data payloads are large, so matches go out in smaller chunks than relation rows
+MATCH_CHUNK_SIZE = 25
+RELATION_CHUNK_SIZE = 500
+
+def chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-        supabase.table('matches').upsert({
-            'match_id': match_id,
-            'raw_data': match_data,
-            'game_type': game_type,
-            'set_number': set_number,
-            'patch_version': patch_version
-        }).execute()
+# matches.raw_data is the durable copy of each payload: Riot only serves match data for a limited time and the
+# archive (TFT_ARCHIVE_PATH) is a local cache. TFT_STORE_RAW_DATA=0 skips it only where the archive is kept.
+STORE_RAW_DATA = os.getenv('TFT_STORE_RAW_DATA', '1') == '1'
 
-        print(f'Match {match_id} stored')
-        return match_id
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = MatchArchive()
+    return _archive
+
+def match_row(match_data):
+    row = {
+        'match_id': match_data['metadata']['match_id'],
+        'game_type': match_data['info']['tft_game_type'],
+        'set_number': match_data['info'].get('tft_set_number', 'unknown'),
+        'patch_version': match_data['info'].get('game_version', 'unknown')
+    }
+    if STORE_RAW_DATA:
+        row['raw_data'] = match_data
+    return row
+
+def store_matches(matches, chunk_size=MATCH_CHUNK_SIZE):
+    stored_ids = []
+    try:
+        with metrics.timed('archive_seconds', operation='put'):
+            get_archive().put_many(matches)
+        rows = list({row['match_id']: row for row in map(match_row, matches)}.values())
+        for chunk in chunked(rows, chunk_size):
+            execute(supabase.table('matches').upsert(chunk), 'matches', 'upsert')
+            stored_ids.extend(row['match_id'] for row in chunk)
+
+        print(f'{len(stored_ids)} matches stored')
+        return stored_ids
+    except Exception as e:
+        print(f'Error storing matches: {e}')
+        return stored_ids
+
+def get_skipped_match_ids(match_ids, target_set, chunk_size=100):
+    skipped_ids = set()
+    try:
+        match_ids = list(match_ids)
+        for chunk in chunked(match_ids, chunk_size):
+            query = supabase.table('skipped_matches').select('match_id, set_number').in_('match_id', chunk)
+            result = execute(query, 'skipped_matches', 'select')
+            # Compared here rather than with neq, which would also drop rows whose set_number is null
+            skipped_ids.update(row['match_id'] for row in result.data if row['set_number'] != target_set)
+        return skipped_ids
+    except Exception as e:
+        print(f'Error fetching skipped match IDs: {e}')
+        return skipped_ids
+
+def store_skipped_matches(skipped):
+    try:
+        rows = [{'match_id': match_id, 'set_number': set_number, 'skipped_at': int(time.time())}
+                for match_id, set_number in skipped.items()]
+        for chunk in chunked(rows, RELATION_CHUNK_SIZE):
+            execute(supabase.table('skipped_matches').upsert(chunk), 'skipped_matches', 'upsert')
+        return True
     except Exception as e:
-        print(f'Error storing match: {e}')
+        print(f'Error storing skipped matches: {e}')
+        return False
+
+def get_ingest_cursor(puuid):
+    try:
+        result = execute(supabase.table('ingest_cursors').select('*').eq('puuid', puuid), 'ingest_cursors', 'select')
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f'Error fetching ingest cursor: {e}')
+        return None
+
+def save_ingest_cursor(puuid, **fields):
+    try:
+        execute(supabase.table('ingest_cursors').upsert({'puuid': puuid, 'updated_at': int(time.time()), **fields}), 'ingest_cursors', 'upsert')
+        return True
+    except Exception as e:
+        print(f'Error saving ingest cursor: {e}')
+        return False
+
+def get_latest_patch_version():
+    try:
+        # Match IDs sort by platform prefix, not time, so the newest game is found through its board
+        query = supabase.table('participant_boards').select('match_id').gt('game_datetime', 0).order('game_datetime', desc=True)
+        latest = execute(query.limit(1), 'participant_boards', 'select')
+        if not latest.data:
+            return None
+        result = execute(supabase.table('matches').select('patch_version').eq('match_id', latest.data[0]['match_id']),
+                         'matches', 'select')
+        return result.data[0]['patch_version'] if result.data else None
+    except Exception as e:
+        print(f'Error fetching latest patch version: {e}')
         return None
+
+def store_match(match_data):
+    stored = store_matches([match_data])
+    return stored[0] if stored else None
     
-def get_tracked_players():
+_tracked_players = None
+
+def invalidate_tracked_players():
+    global _tracked_players
+    _tracked_players = None
+
+def get_tracked_players(refresh=False):
+    global _tracked_players
+    if _tracked_players is not None and not refresh:
+        return _tracked_players
     try:
-        result = supabase.table('players').select('puuid').execute()
-        return {player['puuid'] for player in result.data}
+        result = execute(supabase.table('players').select('puuid'), 'players', 'select')
+        _tracked_players = {player['puuid'] for player in result.data}
+        return _tracked_players
     except Exception as e:
         print(f'Error fetching tracked players: {e}')
         return set()
 
 
-def store_participant_relations(match_data):
+BOARD_COLUMNS = ('match_id, puuid, placement, game_type, game_datetime, units, traits, '
+                 'total_damage_to_players, riot_id_game_name, level, gold_left, board_value, last_round, patch_number')
+
+def participant_board_row(match_data, participant):
+    return {
+        'match_id': match_data['metadata']['match_id'],
+        'puuid': participant['puuid'],
+        'placement': participant['placement'],
+        'game_type': match_data['info']['tft_game_type'],
+        'game_datetime': match_data['info'].get('game_datetime'),
+        'units': participant['units'],
+        'traits': participant['traits'],
+        'total_damage_to_players': participant['total_damage_to_players'],
+        'riot_id_game_name': participant.get('riotIdGameName', 'Unknown'),
+        'level': participant.get('level'),
+        'gold_left': participant.get('gold_left'),
+        **participant_features(match_data, participant)
+    }
+
+def get_board_values(match_ids, chunk_size=100):
+    board_values = {}
+    try:
+        for chunk in chunked(list(match_ids), chunk_size):
+            query = supabase.table('participant_boards').select('match_id, puuid, board_value').in_('match_id', chunk)
+            result = execute(query, 'participant_boards', 'select')
+            board_values.update(((row['match_id'], row['puuid']), row['board_value'])
+                                for row in result.data if row['board_value'] is not None)
+        return board_values
+    except Exception as e:
+        print(f'Error fetching board values: {e}')
+        return board_values
+
+def get_existing_relations(rows, chunk_size=100, page_size=1000):
+    existing = set()
+    puuids = list({row['puuid'] for row in rows})
+    for chunk in chunked(list({row['match_id'] for row in rows}), chunk_size):
+        # A chunk holds a row per tracked player in each match, so it is paged past the response cap as well
+        start = 0
+        while True:
+            query = (supabase.table('player_matches').select('puuid, match_id').in_('match_id', chunk).in_('puuid', puuids)
+                     .order('match_id').order('puuid'))
+            result = execute(query.range(start, start + page_size - 1), 'player_matches', 'select')
+            if not result.data:
+                break
+            existing.update((row['puuid'], row['match_id']) for row in result.data)
+            start += len(result.data)
+    return existing
+
+def store_participant_relations_bulk(matches, chunk_size=RELATION_CHUNK_SIZE):
     try:
-        match_id = match_data['metadata']['match_id']
-        participants = match_data['info']['participants']
         tracked_puuids = get_tracked_players()
-        
-        stored_count = 0
-        for participant in participants:
-            puuid = participant['puuid']
-            placement = participant['placement']
-
-            if puuid in tracked_puuids:
-                supabase.table('player_matches').upsert({
-                    'puuid': puuid,
-                    'match_id': match_id,
-                    'placement': placement
-                }).execute()
-                stored_count +=1
-        
-        print(f"Stored {len(participants)} participant relations for {match_id}")
+
+        rows = []
+        boards = []
+        entries = []
+        for match_data in matches:
+            match_id = match_data['metadata']['match_id']
+            patch = parse_patch(match_data['info'].get('game_version')) or 'unknown'
+            for participant in match_data['info']['participants']:
+                if participant['puuid'] in tracked_puuids:
+                    rows.append({
+                        'puuid': participant['puuid'],
+                        'match_id': match_id,
+                        'placement': participant['placement']
+                    })
+                    boards.append(participant_board_row(match_data, participant))
+                    entries.append(board_entry(participant['puuid'], match_data['info']['tft_game_type'], patch,
+                                               participant['placement'], participant['units']))
+
+        # Held from the existence check to the aggregate write so a relation is never counted twice
+        with _aggregates_lock:
+            existing = get_existing_relations(rows) if rows else set()
+            new_entries = [entry for entry, row in zip(entries, rows) if (row['puuid'], row['match_id']) not in existing]
+
+            for chunk in chunked(rows, chunk_size):
+                execute(supabase.table('player_matches').upsert(chunk), 'player_matches', 'upsert')
+            for chunk in chunked(boards, chunk_size):
+                execute(supabase.table('participant_boards').upsert(chunk), 'participant_boards', 'upsert')
+            add_player_aggregates(aggregate_boards(new_entries))
+        invalidate_player_matches({board['puuid'] for board in boards})
+
+        print(f"Stored {len(rows)} participant relations for {len(matches)} matches")
         return True
     except Exception as e:
         print(f"Error storing participant relations: {e}")
+        # Relations may have landed without their aggregates, so every player is checked again on the next read
+        _aggregated_puuids.clear()
         return False
 
-def get_player_matches(puuid):
-    try:
-        result = supabase.table('player_matches').select('match_id, placement').eq('puuid',puuid).execute()
+def store_participant_relations(match_data):
+    return store_participant_relations_bulk([match_data])
+
+def get_raw_matches(match_ids, chunk_size=MATCH_CHUNK_SIZE):
+    archive = get_archive()
+    with metrics.timed('archive_seconds', operation='get'):
+        matches = archive.get_many(match_ids)
+    missing_ids = [match_id for match_id in match_ids if match_id not in matches]
+
+    for chunk in chunked(missing_ids, chunk_size):
+        result = execute(supabase.table('matches').select('match_id, raw_data').in_('match_id', chunk), 'matches', 'select')
+        fetched = [row['raw_data'] for row in result.data if row['raw_data']]
+        archive.put_many(fetched)
+        matches.update((match_data['metadata']['match_id'], match_data) for match_data in fetched)
+
+    unavailable = len(set(match_ids) - matches.keys())
+    if unavailable:
+        metrics.increment('raw_matches_missing_total', unavailable)
+        print(f'{unavailable} of {len(match_ids)} matches are neither archived nor stored with raw_data, skipping them')
+    return matches
+
+def iter_match_ids(page_size=1000):
+    last_match_id = None
+    while True:
+        query = supabase.table('matches').select('match_id')
+        if last_match_id is not None:
+            query = query.gt('match_id', last_match_id)
+        result = execute(query.order('match_id').limit(page_size), 'matches', 'select')
+        if not result.data:
+            return
+        yield from (row['match_id'] for row in result.data)
+        last_match_id = result.data[-1]['match_id']
+
+def iter_raw_matches(page_size=MATCH_CHUNK_SIZE):
+    for match_ids in chunked(iter_match_ids(), page_size):
+        yield from get_raw_matches(match_ids, page_size).values()
+
+def rebuild_participant_boards(page_size=MATCH_CHUNK_SIZE):
+    total = 0
+    for matches in chunked(iter_raw_matches(page_size), page_size):
+        store_participant_relations_bulk(matches)
+        total += len(matches)
+    print(f'Rebuilt participant boards from {total} archived matches')
+    return total
+
+def iter_player_rows(table, puuid, columns, page_size=100, since=None, filters=()):
+    last_match_id = None
+    while True:
+        query = supabase.table(table).select(columns).eq('puuid', puuid)
+        if since is not None:
+            query = query.gte('game_datetime', since)
+        for operator, column, value in filters:
+            query = getattr(query, operator)(column, value)
+        if last_match_id is not None:
+            query = query.gt('match_id', last_match_id)
+        result = execute(query.order('match_id').limit(page_size), table, 'select')
 
         if not result.data:
-            return[]
-        
-        match_ids = [row['match_id'] for row in result.data]
-        matches_result = supabase.table('matches').select('*').in_('match_id',match_ids).execute()
-
-        user_matches = []
-        for match_row in matches_result.data:
-            placement = next(row['placement'] for row in result.data if row['match_id'] == match_row['match_id'])
-
-            match_data = {
-                'placement': placement,
-                'game_type': match_row['game_type'],
-                'units': [],
-                'traits': [],
-                'total_damage_to_players': 0,
-                'riotIdGameName': 'Unknown'
-            }
-
-            raw_data = match_row['raw_data']
-            for participant in raw_data['info']['participants']:
+            return
+        yield from result.data
+        last_match_id = result.data[-1]['match_id']
+
+def iter_player_raw_matches(puuid, page_size=MATCH_CHUNK_SIZE):
+    match_ids = (row['match_id'] for row in iter_player_rows('player_matches', puuid, 'match_id', 1000))
+    for chunk in chunked(match_ids, page_size):
+        yield from get_raw_matches(chunk, page_size).values()
+
+_backfilled_puuids = set()
+
+def backfill_participant_boards(puuid, chunk_size=MATCH_CHUNK_SIZE):
+    # Boards never written, or written before features were derived at ingest (board_value is null), are
+    # rebuilt from the raw match so filters pushed onto the feature columns never drop older games
+    board_values = {row['match_id']: row['board_value']
+                    for row in iter_player_rows('participant_boards', puuid, 'match_id, board_value', 1000)}
+    placements = {row['match_id']: row['placement']
+                  for row in iter_player_rows('player_matches', puuid, 'match_id, placement', 1000)}
+    missing_ids = [match_id for match_id in placements if board_values.get(match_id) is None]
+
+    # Streamed a chunk of lobbies at a time, since on the first read this can be the whole history
+    total = 0
+    for chunk in chunked(missing_ids, chunk_size):
+        boards = []
+        for match_id, match_data in get_raw_matches(chunk, chunk_size).items():
+            for participant in match_data['info']['participants']:
                 if participant['puuid'] == puuid:
-                    match_data['units'] = participant['units']
-                    match_data['traits'] = participant['traits']
-                    match_data['total_damage_to_players'] = participant['total_damage_to_players']
-                    match_data['riotIdGameName'] = participant.get('riotIdGameName','Unknown')
+                    board = participant_board_row(match_data, participant)
+                    board['placement'] = placements[match_id]
+                    boards.append(board)
                     break
+        if boards:
+            execute(supabase.table('participant_boards').upsert(boards), 'participant_boards', 'upsert')
+        total += len(boards)
+
+    if total:
+        print(f'Backfilled {total} participant boards')
+    _backfilled_puuids.add(puuid)
+    return total
+
+MATCH_CACHE_TTL = 300
+MATCH_CACHE_SIZE = 32
+# Longer histories are streamed without being cached so memory stays bounded
+MATCH_CACHE_MAX_MATCHES = 5000
+
+_match_cache = OrderedDict()
+_match_cache_lock = threading.Lock()
+match_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def get_cached_matches(puuid):
+    with _match_cache_lock:
+        entry = _match_cache.get(puuid)
+        if entry is None or entry[0] < time.monotonic():
+            _match_cache.pop(puuid, None)
+            match_cache_stats['misses'] += 1
+            return None
+        _match_cache.move_to_end(puuid)
+        match_cache_stats['hits'] += 1
+        return entry[1]
+
+def cache_matches(puuid, matches):
+    with _match_cache_lock:
+        _match_cache[puuid] = (time.monotonic() + MATCH_CACHE_TTL, matches)
+        _match_cache.move_to_end(puuid)
+        while len(_match_cache) > MATCH_CACHE_SIZE:
+            _match_cache.popitem(last=False)
+            match_cache_stats['evictions'] += 1
 
-            user_matches.append(match_data)
-        return user_matches
+def invalidate_player_matches(puuids=None):
+    with _match_cache_lock:
+        if puuids is None:
+            _match_cache.clear()
+        else:
+            for puuid in puuids:
+                _match_cache.pop(puuid, None)
+
+def get_match_cache_stats():
+    with _match_cache_lock:
+        return dict(match_cache_stats, size=len(_match_cache))
+
+def iter_player_matches(puuid, page_size=100, since=None, filters=()):
+    # Only full histories are cached; filtered reads always go to storage
+    full_history = since is None and not filters
+    if full_history:
+        cached = get_cached_matches(puuid)
+        if cached is not None:
+            yield from cached
+            return
+
+    try:
+        if puuid not in _backfilled_puuids:
+            backfill_participant_boards(puuid)
+
+        matches = [] if full_history else None
+        for row in iter_player_rows('participant_boards', puuid, BOARD_COLUMNS, page_size, since, filters):
+            match = parse_board(row)
+            if matches is not None:
+                matches.append(match)
+                if len(matches) > MATCH_CACHE_MAX_MATCHES:
+                    matches = None
+            yield match
+
+        if matches is not None:
+            cache_matches(puuid, matches)
 
     except Exception as e:
         print(f' Error fetching player matches: {e}')
-        return [] 
\ No newline at end of file
+
+def get_player_matches(puuid):
+    return list(iter_player_matches(puuid))
+
+# Board conditions answered by the indexed feature columns of participant_boards
+BOARD_FILTERS = {
+    'min_board_value': ('gte', 'board_value'),
+    'max_board_value': ('lte', 'board_value'),
+    'min_level': ('gte', 'level'),
+    'min_last_round': ('gte', 'last_round'),
+    'max_gold_left': ('lte', 'gold_left'),
+    'patch_number': ('eq', 'patch_number')
+}
+
+def get_player_boards(puuid, **conditions):
+    filters = [(*BOARD_FILTERS[name], value) for name, value in conditions.items() if value is not None]
+    return list(iter_player_matches(puuid, filters=filters))
+
+_aggregates_lock = threading.RLock()
+_aggregated_puuids = set()
+
+def aggregate_row(key, aggregate):
+    puuid, game_type, champion, patch = key
+    return {'puuid': puuid, 'game_type': game_type, 'champion': champion, 'patch': patch, **aggregate}
+
+def get_aggregate_rows(keys, page_size=1000, chunk_size=100):
+    # Paged until an empty page, since PostgREST caps every response (1000 rows by default) without saying so
+    puuids, game_types, champions, patches = (list({key[i] for key in keys}) for i in range(4))
+    rows = {}
+    for champion_chunk in chunked(champions, chunk_size):
+        start = 0
+        while True:
+            query = (supabase.table('player_aggregates').select('*').in_('puuid', puuids).in_('game_type', game_types)
+                     .in_('champion', champion_chunk).in_('patch', patches)
+                     .order('puuid').order('game_type').order('champion').order('patch'))
+            result = execute(query.range(start, start + page_size - 1), 'player_aggregates', 'select')
+            if not result.data:
+                break
+            rows.update(((row['puuid'], row['game_type'], row['champion'], row['patch']), row) for row in result.data)
+            start += len(result.data)
+    return rows
+
+def add_player_aggregates(deltas, chunk_size=RELATION_CHUNK_SIZE):
+    if not deltas:
+        return
+    with _aggregates_lock:
+        current = get_aggregate_rows(deltas)
+
+        rows = []
+        for key, delta in deltas.items():
+            aggregate = empty_aggregate()
+            if key in current:
+                merge_aggregate(aggregate, current[key])
+            rows.append(aggregate_row(key, merge_aggregate(aggregate, delta)))
+        for chunk in chunked(rows, chunk_size):
+            execute(supabase.table('player_aggregates').upsert(chunk), 'player_aggregates', 'upsert')
+
+def get_match_patches(match_ids, chunk_size=100):
+    patches = {}
+    for chunk in chunked(match_ids, chunk_size):
+        result = execute(supabase.table('matches').select('match_id, patch_version').in_('match_id', chunk),
+                         'matches', 'select')
+        patches.update((row['match_id'], parse_patch(row['patch_version']) or 'unknown') for row in result.data)
+    return patches
+
+def rebuild_player_aggregates(puuids=None, chunk_size=RELATION_CHUNK_SIZE):
+    if puuids is None:
+        puuids = get_tracked_players(refresh=True)
+    total = 0
+    for puuid in puuids:
+        # Held while the boards are read too, so relations stored meanwhile are not lost by the delete
+        with _aggregates_lock:
+            boards = list(iter_player_rows('participant_boards', puuid, 'match_id, placement, game_type, units', 1000))
+            patches = get_match_patches([board['match_id'] for board in boards])
+            aggregates = aggregate_boards(
+                board_entry(puuid, board['game_type'], patches.get(board['match_id'], 'unknown'), board['placement'], board['units'])
+                for board in boards)
+
+            execute(supabase.table('player_aggregates').delete().eq('puuid', puuid), 'player_aggregates', 'delete')
+            for chunk in chunked([aggregate_row(key, aggregate) for key, aggregate in aggregates.items()], chunk_size):
+                execute(supabase.table('player_aggregates').upsert(chunk), 'player_aggregates', 'upsert')
+        _aggregated_puuids.add(puuid)
+        total += len(boards)
+    print(f'Rebuilt aggregates from {total} boards for {len(puuids)} players')
+    return total
+
+def ensure_player_aggregates(puuid):
+    if puuid in _aggregated_puuids:
+        return
+    # Matches stored before aggregates existed, or whose aggregate write failed, leave the whole-game
+    # counters short of player_matches; the player is then rebuilt from their boards
+    with _aggregates_lock:
+        if puuid not in _backfilled_puuids:
+            backfill_participant_boards(puuid)
+        aggregated_games = sum(row['games'] for row in iter_player_aggregates(puuid, 'game_type, patch, games', champion=OVERALL))
+        stored_games = sum(1 for _ in iter_player_rows('player_matches', puuid, 'match_id', 1000))
+        if aggregated_games != stored_games:
+            print(f'Aggregates cover {aggregated_games} of {stored_games} stored matches, rebuilding')
+            rebuild_player_aggregates([puuid])
+        _aggregated_puuids.add(puuid)
+
+def iter_player_aggregates(puuid, columns='*', page_size=1000, **conditions):
+    # Paged like get_aggregate_rows: a player passes 1000 (game_type, champion, patch) rows after a few patches
+    start = 0
+    while True:
+        query = supabase.table('player_aggregates').select(columns).eq('puuid', puuid)
+        for column, value in conditions.items():
+            if value is not None:
+                query = query.eq(column, value)
+        query = query.order('game_type').order('champion').order('patch')
+        result = execute(query.range(start, start + page_size - 1), 'player_aggregates', 'select')
+        if not result.data:
+            return
+        yield from result.data
+        start += len(result.data)
+
+def get_player_aggregates(puuid, game_type=None, champion=None, patch=None):
+    try:
+        ensure_player_aggregates(puuid)
+        return list(iter_player_aggregates(puuid, game_type=game_type, champion=champion, patch=patch))
+    except Exception as e:
+        print(f'Error fetching player aggregates: {e}')
+        return []
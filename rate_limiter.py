@@ -0,0 +1,89 @@
+import threading
+import time
+
+# Personal/development key limits, replaced by the X-App-Rate-Limit header on the first response
+DEFAULT_APP_LIMITS = '20:1,100:120'
+
+
+def parse_rate_limits(header_value):
+    limits = []
+    for part in header_value.split(','):
+        count, window = part.strip().split(':')
+        limits.append((int(count), int(window)))
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.window = window
+        self.rate = capacity / window
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def sync(self, used):
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class RateLimiter:
+    def __init__(self, app_limits=DEFAULT_APP_LIMITS):
+        self.lock = threading.Lock()
+        self.app_buckets = self.make_buckets(parse_rate_limits(app_limits))
+        self.method_buckets = {}
+        self.blocked_until = {}
+
+    def make_buckets(self, limits):
+        return [TokenBucket(count, window) for count, window in limits]
+
+    def acquire(self, method):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                buckets = self.app_buckets + self.method_buckets.get(method, [])
+                waits = [bucket.wait_time(now) for bucket in buckets]
+                waits.append(self.blocked_until.get(None, 0) - now)
+                waits.append(self.blocked_until.get(method, 0) - now)
+                wait = max(waits)
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.consume()
+                    return
+            time.sleep(wait)
+
+    def update_buckets(self, buckets, limit_header, count_header):
+        limits = parse_rate_limits(limit_header)
+        if [(b.capacity, b.window) for b in buckets] != limits:
+            buckets = self.make_buckets(limits)
+        if count_header:
+            for bucket, (used, window) in zip(buckets, parse_rate_limits(count_header)):
+                bucket.sync(used)
+        return buckets
+
+    def update_limits(self, method, headers):
+        with self.lock:
+            app_limit = headers.get('X-App-Rate-Limit')
+            if app_limit:
+                self.app_buckets = self.update_buckets(self.app_buckets, app_limit,
+                                                       headers.get('X-App-Rate-Limit-Count'))
+            method_limit = headers.get('X-Method-Rate-Limit')
+            if method_limit:
+                self.method_buckets[method] = self.update_buckets(self.method_buckets.get(method, []), method_limit,
+                                                                  headers.get('X-Method-Rate-Limit-Count'))
+
+    def block(self, seconds, method=None):
+        with self.lock:
+            until = time.monotonic() + seconds
+            self.blocked_until[method] = max(self.blocked_until.get(method, 0), until)
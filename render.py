@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+import sys
+from contextlib import contextmanager
+
+# Reports are produced as generators of lines and written in batches through one buffered
+# writer, so long histories never build per-match strings or hit stdout once per line.
+
+FORMATS = ('text', 'jsonl', 'csv')
+WRITE_BATCH = 500
+FILE_BUFFER_SIZE = 1 << 20
+
+
+def write_lines(lines, out=None, batch_size=WRITE_BATCH):
+    out = out or sys.stdout
+    batch = []
+    for line in lines:
+        batch.append(line)
+        batch.append('\n')
+        if len(batch) >= batch_size * 2:
+            out.write(''.join(batch))
+            batch = []
+    if batch:
+        out.write(''.join(batch))
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False)
+
+
+def csv_value(value):
+    if isinstance(value, (list, tuple)):
+        return '; '.join(map(str, value))
+    return value
+
+
+def csv_lines(records, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='')
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for record in records:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([csv_value(record.get(column)) for column in columns])
+        yield buffer.getvalue()
+
+
+def report_lines(fmt, text, records, columns):
+    # text and records are callables so only the requested format is ever built
+    if fmt == 'text':
+        return text()
+    if fmt == 'jsonl':
+        return jsonl_lines(records())
+    if fmt == 'csv':
+        return csv_lines(records(), columns)
+    raise ValueError(f'Unknown report format {fmt}, expected one of {", ".join(FORMATS)}')
+
+
+def render_report(fmt, text, records, columns, out=None):
+    write_lines(report_lines(fmt, text, records, columns), out)
+
+
+@contextmanager
+def open_output(path=None):
+    if path is None:
+        yield sys.stdout
+        sys.stdout.flush()
+        return
+    with open(path, 'w', encoding='utf-8', newline='', buffering=FILE_BUFFER_SIZE) as f:
+        yield f
@@ -1,70 +1,171 @@
 import requests
+from requests.adapters import HTTPAdapter
 import os
 from dotenv import load_dotenv
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import RateLimiter
+import metrics
 
 load_dotenv()
 
 API_KEY = os.getenv('API_KEY')
+API_BASE = os.getenv('RIOT_API_BASE', 'https://{region}.api.riotgames.com')
+DEFAULT_REGION = os.getenv('RIOT_REGION', 'europe')
+MAX_WORKERS = 10
+MAX_RETRIES = 3
+
+TARGET_SET = 15
+# Live release of each set (epoch seconds), used as startTime so older matches are never listed
+SET_START_TIMES = {
+    15: 1753833600
+}
+
+# Match and account endpoints are served per routing cluster; match IDs start with the platform
+PLATFORM_TO_REGION = {
+    'BR1': 'americas', 'LA1': 'americas', 'LA2': 'americas', 'NA1': 'americas',
+    'EUN1': 'europe', 'EUW1': 'europe', 'ME1': 'europe', 'RU': 'europe', 'TR1': 'europe',
+    'JP1': 'asia', 'KR': 'asia',
+    'OC1': 'sea', 'PH2': 'sea', 'SG2': 'sea', 'TH2': 'sea', 'TW2': 'sea', 'VN2': 'sea'
+}
+REGIONS = ('americas', 'asia', 'europe', 'sea')
+# account-v1 is not served from sea, those accounts are looked up through asia
+ACCOUNT_REGIONS = {'sea': 'asia'}
+
+
+def resolve_region(value=None):
+    if not value:
+        return DEFAULT_REGION
+    if value.lower() in REGIONS:
+        return value.lower()
+    if value.upper() not in PLATFORM_TO_REGION:
+        raise ValueError(f'Unknown region or platform {value!r}')
+    return PLATFORM_TO_REGION[value.upper()]
+
+
+def match_region(match_id):
+    return PLATFORM_TO_REGION.get(match_id.split('_')[0].upper(), DEFAULT_REGION)
+
+
+class RegionClient:
+    # Each cluster has its own keep-alive pool and its own rate limit budget
+    def __init__(self, region):
+        self.region = region
+        self.base_url = API_BASE.format(region=region)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+        self.rate_limiter = RateLimiter()
+
+
+_region_clients = {}
+_region_clients_lock = threading.Lock()
+
+def get_region_client(region=None):
+    region = resolve_region(region)
+    with _region_clients_lock:
+        if region not in _region_clients:
+            _region_clients[region] = RegionClient(region)
+        return _region_clients[region]
+
+
+def riot_get(path, method, API_KEY, params=None, region=None):
+    client = get_region_client(region)
+    url = f'{client.base_url}{path}'
+    session, rate_limiter = client.session, client.rate_limiter
+    for attempt in range(MAX_RETRIES + 1):
+        with metrics.timed('riot_rate_limit_wait_seconds', endpoint=method, region=client.region):
+            rate_limiter.acquire(method)
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, headers={'X-Riot-Token': API_KEY}, timeout=10)
+        except requests.RequestException:
+            metrics.increment('riot_requests_total', endpoint=method, region=client.region, status='error')
+            raise
+        metrics.observe('riot_request_seconds', time.perf_counter() - start,
+                        endpoint=method, region=client.region, status=response.status_code)
+        metrics.increment('riot_requests_total', endpoint=method, region=client.region, status=response.status_code)
+        rate_limiter.update_limits(method, response.headers)
+
+        if attempt < MAX_RETRIES:
+            if response.status_code == 429:
+                retry_after = float(response.headers.get('Retry-After', 1))
+                limit_type = response.headers.get('X-Rate-Limit-Type')
+                print(f'Rate limited ({limit_type or "unknown"}), retrying in {retry_after}s')
+                metrics.increment('riot_retries_total', endpoint=method, region=client.region, reason=f'429_{limit_type or "unknown"}')
+                rate_limiter.block(retry_after, method if limit_type == 'method' else None)
+                continue
+            if response.status_code >= 500:
+                metrics.increment('riot_retries_total', endpoint=method, region=client.region, reason='server_error')
+                metrics.sleep(2 ** attempt, 'server_error_backoff')
+                continue
 
-def get_puuid(username, tag, API_KEY):
-    account_url = 'https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id'
-    url = f"{account_url}/{username}/{tag}?api_key={API_KEY}"
-    try:
-        response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
+        return response.json()
+
+
+def print_api_error(e):
+    print(f"API error: {e}")
+    print(f"Status Code: {e.response.status_code if getattr(e, 'response', None) is not None else 'N/A'}")
+
+
+def get_puuid(username, tag, API_KEY, region=None):
+    path = f"/riot/account/v1/accounts/by-riot-id/{username}/{tag}"
+    region = resolve_region(region)
+    try:
+        data = riot_get(path, 'account', API_KEY, region=ACCOUNT_REGIONS.get(region, region))
         return data['puuid']
     except requests.RequestException as e:
-        print(f"API error: {e}")
-        print(f"Status Code: {response.status_code if 'response' in locals() else 'N/A'}")
+        print_api_error(e)
         return None
 
 
-def get_matchid(puuid,start,count,API_KEY):
-    matchid_url = 'https://europe.api.riotgames.com/tft/match/v1/matches/by-puuid'
-    url = f"{matchid_url}/{puuid}/ids?start={start}&count={count}&api_key={API_KEY}"
+def get_matchid(puuid, start, count, API_KEY, start_time=None, region=None):
+    path = f"/tft/match/v1/matches/by-puuid/{puuid}/ids"
+    params = {'start': start, 'count': count}
+    if start_time is not None:
+        params['startTime'] = start_time
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data
+        return riot_get(path, 'match_ids', API_KEY, params, region)
     except requests.RequestException as e:
-        print(f"API error: {e}")
-        print(f"Status Code: {response.status_code if 'response' in locals() else 'N/A'}")
+        print_api_error(e)
         return None
 
 
-def get_match_info(match_ids, API_KEY, target_set = 15):
-    matchinfo_url = 'https://europe.api.riotgames.com/tft/match/v1/matches'
-    match_info = []
+def fetch_match(match_id, API_KEY):
+    path = f"/tft/match/v1/matches/{match_id}"
+    try:
+        return riot_get(path, 'match', API_KEY, region=match_region(match_id))
+    except requests.RequestException as e:
+        print(f"Could not fetch {match_id}")
+        print_api_error(e)
+        return None
+
+
+def fetch_matches(match_ids, API_KEY, max_workers=MAX_WORKERS):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda match_id: fetch_match(match_id, API_KEY), match_ids))
+
+
+def get_match_info(match_ids, API_KEY, target_set = TARGET_SET, max_workers=MAX_WORKERS, skipped=None):
+    match_ids_by_region = {}
     for match_id in match_ids:
-        url = f"{matchinfo_url}/{match_id}?api_key={API_KEY}"
-        time.sleep(1)
-        try:             
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+        match_ids_by_region.setdefault(match_region(match_id), []).append(match_id)
+
+    # Each cluster has its own rate budget, so clusters are fetched side by side with their own workers
+    match_info = []
+    with ThreadPoolExecutor(max_workers=max(len(match_ids_by_region), 1)) as executor:
+        results = executor.map(lambda region_ids: fetch_matches(region_ids, API_KEY, max_workers),
+                               match_ids_by_region.values())
+        for data in (data for region_results in results for data in region_results):
+            if data is None:
+                continue
             set_number = data['info'].get('tft_set_number')
             if set_number == target_set:
                 match_info.append(data)
             else:
                 print('Skipped')
-        except requests.RequestException as e:
-            print(f"API error: {e}")
-            print(f"Status Code: {response.status_code if 'response' in locals() else 'N/A'}")
-            return None
+                if skipped is not None:
+                    skipped[data['metadata']['match_id']] = set_number
     return match_info
-
-
-def get_champion_cost():
-    response = requests.get('https://ddragon.leagueoflegends.com/cdn/15.17.1/data/en_US/tft-champion.json')
-    ddragon = response.json()
-
-    champions_cost = {}
-    for champion_id, champion_data in ddragon['data'].items():
-        if 'TFT15_' in champion_id:
-            clean_name = champion_id.split('_')[1]
-            cost =  champion_data['tier']
-            champions_cost[clean_name] = cost
-    return champions_cost
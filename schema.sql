@@ -0,0 +1,90 @@
+create table if not exists players (
+    puuid text primary key,
+    username text,
+    tag text
+);
+
+-- Routing cluster the player's account and matches are served from (europe, americas, asia, sea)
+alter table players add column if not exists region text;
+
+create table if not exists matches (
+    match_id text primary key,
+    raw_data jsonb,
+    game_type text,
+    set_number text,
+    patch_version text
+);
+
+create table if not exists player_matches (
+    puuid text not null,
+    match_id text not null,
+    placement integer,
+    primary key (puuid, match_id)
+);
+
+-- Per-player slice of matches.raw_data, written at ingest so reads never download full lobbies
+create table if not exists participant_boards (
+    match_id text not null,
+    puuid text not null,
+    placement integer,
+    game_type text,
+    game_datetime bigint,
+    units jsonb,
+    traits jsonb,
+    total_damage_to_players integer,
+    riot_id_game_name text,
+    level integer,
+    gold_left integer,
+    primary key (puuid, match_id)
+);
+
+-- Features derived at ingest (see features.py) so filters never re-derive them from units and traits.
+-- Rows stored earlier are filled in from the archived match the first time the player is read.
+alter table participant_boards add column if not exists board_value integer;
+alter table participant_boards add column if not exists item_count integer;
+alter table participant_boards add column if not exists active_traits jsonb;
+alter table participant_boards add column if not exists last_round integer;
+alter table participant_boards add column if not exists patch_number integer;
+
+create index if not exists player_matches_puuid_idx on player_matches (puuid);
+create index if not exists participant_boards_value_idx on participant_boards (puuid, board_value);
+create index if not exists participant_boards_patch_idx on participant_boards (puuid, patch_number);
+create index if not exists participant_boards_level_idx on participant_boards (puuid, level);
+create index if not exists participant_boards_round_idx on participant_boards (puuid, last_round);
+create index if not exists participant_boards_datetime_idx on participant_boards (game_datetime);
+create index if not exists participant_boards_item_count_idx on participant_boards (puuid, item_count);
+create index if not exists participant_boards_match_idx on participant_boards (match_id);
+-- Serves active_traits @> {"Trait": tier} filters; the SQLite backend skips it and filters on the puuid key
+create index if not exists participant_boards_traits_idx on participant_boards using gin (active_traits);
+create index if not exists matches_set_patch_idx on matches (set_number, patch_version);
+
+-- Per-player ingestion checkpoint: newest listed match and IDs listed but not yet stored
+create table if not exists ingest_cursors (
+    puuid text primary key,
+    last_match_id text,
+    last_game_datetime bigint,
+    pending_match_ids jsonb,
+    updated_at bigint
+);
+
+-- Matches downloaded but outside the target set, so they are never fetched again
+create table if not exists skipped_matches (
+    match_id text primary key,
+    set_number integer,
+    skipped_at bigint
+);
+
+-- Placement counters per player, game type, champion ('*' for whole games) and patch,
+-- updated as relations are stored so stat reads never scan the match history
+create table if not exists player_aggregates (
+    puuid text not null,
+    game_type text not null,
+    champion text not null,
+    patch text not null,
+    games integer,
+    placement_sum integer,
+    top4 integer,
+    wins integer,
+    placement_hist jsonb,
+    primary key (puuid, game_type, champion, patch)
+);
@@ -0,0 +1,98 @@
+import json
+import os
+import time
+import requests
+from models import get_latest_patch_version
+from boards import clean_champion_name, parse_patch
+
+DDRAGON_URL = 'https://ddragon.leagueoflegends.com/cdn/{version}/data/en_US/{kind}.json'
+DEFAULT_VERSION = '15.17.1'
+CACHE_DIR = os.path.join(os.getenv('TFT_CACHE_DIR', '.cache'), 'static')
+# Cached files younger than this are used without asking Data Dragon whether they changed
+MAX_AGE = 24 * 3600
+
+_static_data = {}
+_champion_costs = {}
+_current_version = None
+
+
+def ddragon_version(game_version):
+    patch = parse_patch(game_version)
+    return f'{patch}.1' if patch else None
+
+
+def get_current_version():
+    global _current_version
+    if _current_version is None:
+        _current_version = ddragon_version(get_latest_patch_version()) or DEFAULT_VERSION
+    return _current_version
+
+
+def read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_static_data(kind, version):
+    path = os.path.join(CACHE_DIR, f'{version}_{kind}.json')
+    cached = read_cache(path)
+    if cached and time.time() - cached['fetched_at'] < MAX_AGE:
+        return cached['data']
+
+    headers = {'If-None-Match': cached['etag']} if cached and cached.get('etag') else {}
+    try:
+        response = requests.get(DDRAGON_URL.format(version=version, kind=kind), headers=headers, timeout=10)
+        if response.status_code == 304:
+            cached['fetched_at'] = time.time()
+            write_cache(path, cached)
+            return cached['data']
+        response.raise_for_status()
+        entry = {
+            'etag': response.headers.get('ETag'),
+            'fetched_at': time.time(),
+            'data': response.json()['data']
+        }
+        write_cache(path, entry)
+        return entry['data']
+    except (requests.RequestException, OSError, ValueError, KeyError) as e:
+        print(f'Could not refresh {kind} {version}: {e}')
+        return cached['data'] if cached else {}
+
+
+def get_static_data(kind, version=None):
+    version = version or get_current_version()
+    key = (kind, version)
+    if key not in _static_data:
+        _static_data[key] = fetch_static_data(kind, version)
+    return _static_data[key]
+
+
+def get_champion_costs(version=None, set_number=15):
+    key = (version or get_current_version(), set_number)
+    if key not in _champion_costs:
+        champions_cost = {}
+        for champion_id, champion_data in get_static_data('tft-champion', key[0]).items():
+            if f'TFT{set_number}_' in champion_id:
+                clean_name = clean_champion_name(champion_id)
+                champions_cost[clean_name] = champion_data['tier']
+        _champion_costs[key] = champions_cost
+    return _champion_costs[key]
+
+
+def get_item_names(version=None):
+    return {item_id: item_data['name'] for item_id, item_data in get_static_data('tft-item', version).items()}
+
+
+def get_trait_names(version=None):
+    return {trait_id: trait_data['name'] for trait_id, trait_data in get_static_data('tft-trait', version).items()}
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+import archive
+import benchmark
+from archive import MatchArchive, canonical_payload
+
+
+class MatchArchiveTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'archive.sqlite')
+        _, self.matches = benchmark.generate_matches(60, 8, seed=3)
+        self.by_id = {match['metadata']['match_id']: match for match in self.matches}
+
+    def test_round_trip(self):
+        store = MatchArchive(self.path)
+        self.assertEqual(store.put_many(self.matches), list(self.by_id))
+
+        self.assertEqual(store.get_many(list(self.by_id) + ['EUW1_0']), self.by_id)
+        self.assertIsNone(store.get('EUW1_0'))
+
+        # A fresh instance has no fragment or dictionary cache, so everything is read back from disk
+        self.assertEqual(MatchArchive(self.path).get_many(self.by_id), self.by_id)
+
+    def test_archived_matches_are_not_stored_again(self):
+        store = MatchArchive(self.path)
+        store.put_many(self.matches[:30])
+        before = store.stats()
+
+        store.put_many(self.matches)
+
+        stats = store.stats()
+        self.assertEqual(stats['matches'], 60)
+        self.assertEqual(stats['blobs'], before['blobs'] + 30)
+        self.assertEqual(stats['dictionaries'], 1)
+
+    def test_older_dictionaries_stay_readable_after_retraining(self):
+        with mock.patch.object(archive, 'DICTIONARY_SAMPLE_SIZE', 10), mock.patch.object(archive, 'RETRAIN_INTERVAL', 20):
+            store = MatchArchive(self.path)
+            for i in range(0, len(self.matches), 10):
+                store.put_many(self.matches[i:i + 10])
+
+        self.assertGreater(store.stats()['dictionaries'], 2)
+        self.assertEqual(MatchArchive(self.path).get_many(self.by_id), self.by_id)
+
+    def test_reads_whole_payload_blobs(self):
+        # Archives written before fragments held each payload whole, deflated without a dictionary
+        store = MatchArchive(self.path)
+        match = self.matches[0]
+        payload = canonical_payload(match)
+        digest = hashlib.sha256(payload).hexdigest()
+        with store.connection:
+            store.connection.execute('insert into blobs (digest, dictionary_id, data) values (?, null, ?)',
+                                     (digest, zlib.compress(payload, 9)))
+            store.connection.execute('insert into match_index values (?, ?)', (match['metadata']['match_id'], digest))
+
+        self.assertEqual(MatchArchive(self.path).get(match['metadata']['match_id']), match)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+# models opens its storage client on import; each test swaps in a LocalClient of its own
+os.environ['TFT_STORAGE_BACKEND'] = 'sqlite'
+os.environ['TFT_SQLITE_PATH'] = ':memory:'
+
+import benchmark
+import filter_dsl
+import models
+from archive import MatchArchive
+from local_db import LocalClient
+
+QUERIES = [
+    'placement<=4',
+    'game_type:pairs AND placement:1..2',
+    'level>=8 AND gold_left<=10',
+    'board_value>=40 AND item_count>=8',
+    'patch:15.15..15.17 AND last_round>30',
+    'trait:StarGuardian>=2',
+    'trait:"Star Guardian">=2 AND placement<=4',
+    'trait:sniper>=1',
+    'trait:StarGuardian=2',
+    'trait:StarGuardian>1',
+    'trait:StarGuardian>=10',
+    'trait:StarGuardian=0',
+    'champion:Jhin[stars>=2] AND placement<=4',
+    'NOT trait:Sniper AND level>=8',
+    'item:Deathblade OR board_value>=60'
+]
+
+
+class FilterQueryTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.players, matches = benchmark.generate_matches(150, 3, seed=7)
+        self.puuid = self.players[0]
+
+        patches = [
+            mock.patch.object(models, 'supabase', LocalClient(os.path.join(workdir.name, 'tft.sqlite'))),
+            mock.patch.object(models, '_archive', MatchArchive(os.path.join(workdir.name, 'archive.sqlite'))),
+            mock.patch.object(models, '_tracked_players', set(self.players)),
+            mock.patch.object(models, '_backfilled_puuids', set()),
+            mock.patch.object(models, '_aggregated_puuids', set()),
+            mock.patch.object(models, '_match_cache', models.OrderedDict()),
+            # Names missing from the board registry are looked up in Data Dragon; keep that offline
+            mock.patch.object(filter_dsl, 'get_trait_names', lambda: [f'TFT15_{name}' for name in benchmark.TRAITS])
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            models.store_matches(matches)
+            models.store_participant_relations_bulk(matches)
+        self.history = models.get_player_matches(self.puuid)
+
+    def in_memory(self, query):
+        node = filter_dsl.parse_query(query)
+        return sorted(board.match_id for board in self.history if node.matches(board))
+
+    def queried(self, query):
+        return sorted(board.match_id for board, _ in filter_dsl.query_boards(self.puuid, query))
+
+    def test_pushed_down_queries_match_in_memory_evaluation(self):
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(self.queried(query), self.in_memory(query))
+
+    def test_stored_columns_and_traits_are_pushed_down(self):
+        filters, residual = filter_dsl.plan_query(filter_dsl.parse_query('trait:sniper>=1 AND placement<=4'))
+        self.assertEqual(filters, [('gte', 'active_traits->>Sniper', 1), ('lte', 'placement', 4)])
+        self.assertIsInstance(residual.children[0], filter_dsl.Trait)
+
+        filters, _ = filter_dsl.plan_query(filter_dsl.parse_query('trait:"Star Guardian"=2'))
+        self.assertEqual(filters, [('contains', 'active_traits', {'StarGuardian': 2})])
+
+        filters, _ = filter_dsl.plan_query(filter_dsl.parse_query('trait:StarGuardian>=10 OR placement:1'))
+        self.assertEqual(filters, [])
+
+    def test_trait_terms_are_rechecked_after_storage(self):
+        # PostgREST compares active_traits->>name as text, so storage may return boards the bound excludes
+        unfiltered = lambda puuid, filters=(): iter(self.history)
+        with mock.patch.object(filter_dsl, 'iter_player_matches', unfiltered):
+            for query in ('trait:StarGuardian>=2', 'trait:StarGuardian=2', 'trait:StarGuardian>=10'):
+                with self.subTest(query=query):
+                    self.assertEqual(self.queried(query), self.in_memory(query))
+
+    def test_rejects_malformed_queries(self):
+        for query in ('champion:', 'foo:1', 'placement>=x', 'champion:Jhin[wings=2]', '(level>=8', 'placement>=1..4'):
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    filter_dsl.parse_query(query)
+
+    def test_json_keys_cannot_inject_sql(self):
+        injected = '''trait:"Sniper') > 0 OR 1=1 OR (json_extract('{}', '$.a">=1'''
+        self.assertEqual(self.queried(injected), [])
+
+        query = models.supabase.table('participant_boards').select('match_id').eq('puuid', self.puuid)
+        self.assertEqual(query.gte("active_traits->>Sniper') > 0 OR 1=1 OR ('", 0).execute().data, [])
+        with self.assertRaises(ValueError):
+            models.supabase.table('participant_boards').select('match_id').gte('active_traits->>a"b', 1).execute()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import requests
+import riot_api
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Scripted (status, headers, body) responses per path; the last one repeats once the script runs out
+    scripts = {}
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path.split('?')[0], time.monotonic()))
+        script = self.scripts.get(self.path.split('?')[0], [(404, {}, {})])
+        status, headers, body = script.pop(0) if len(script) > 1 else script[0]
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def match_payload(match_id):
+    return {'metadata': {'match_id': match_id}, 'info': {'tft_set_number': riot_api.TARGET_SET}}
+
+
+class RiotGetRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        StubHandler.scripts = {}
+        StubHandler.requests_seen = []
+        base_patch = mock.patch.object(riot_api, 'API_BASE', f'http://127.0.0.1:{self.server.server_port}')
+        clients_patch = mock.patch.object(riot_api, '_region_clients', {})
+        base_patch.start()
+        clients_patch.start()
+        self.addCleanup(base_patch.stop)
+        self.addCleanup(clients_patch.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_after_429_honouring_retry_after(self):
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_1'] = [
+            (429, {'Retry-After': '0.3', 'X-Rate-Limit-Type': 'application'}, {}),
+            (200, {}, match_payload('EUW1_1'))
+        ]
+        data = riot_api.riot_get('/tft/match/v1/matches/EUW1_1', 'match', 'test-key', region='europe')
+
+        self.assertEqual(data['metadata']['match_id'], 'EUW1_1')
+        self.assertEqual(len(StubHandler.requests_seen), 2)
+        self.assertGreaterEqual(StubHandler.requests_seen[1][1] - StubHandler.requests_seen[0][1], 0.3)
+
+    def test_retries_server_errors_with_backoff(self):
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_1'] = [(503, {}, {}), (200, {}, match_payload('EUW1_1'))]
+        with mock.patch.object(riot_api.metrics, 'sleep') as sleep:
+            data = riot_api.riot_get('/tft/match/v1/matches/EUW1_1', 'match', 'test-key', region='europe')
+
+        self.assertEqual(data['metadata']['match_id'], 'EUW1_1')
+        sleep.assert_called_once_with(1, 'server_error_backoff')
+
+    def test_gives_up_after_max_retries(self):
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_1'] = [(429, {'Retry-After': '0'}, {})]
+        with self.assertRaises(requests.HTTPError):
+            riot_api.riot_get('/tft/match/v1/matches/EUW1_1', 'match', 'test-key', region='europe')
+        self.assertEqual(len(StubHandler.requests_seen), riot_api.MAX_RETRIES + 1)
+
+    def test_follows_app_rate_limit_headers(self):
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_1'] = [
+            (200, {'X-App-Rate-Limit': '2:1', 'X-App-Rate-Limit-Count': '2:1'}, match_payload('EUW1_1'))
+        ]
+        riot_api.riot_get('/tft/match/v1/matches/EUW1_1', 'match', 'test-key', region='europe')
+        riot_api.riot_get('/tft/match/v1/matches/EUW1_1', 'match', 'test-key', region='europe')
+
+        # The first response reports the 2 per second budget as spent, so the second call waits for a refill
+        self.assertGreaterEqual(StubHandler.requests_seen[1][1] - StubHandler.requests_seen[0][1], 0.4)
+
+    def test_get_match_info_returns_partial_results(self):
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_1'] = [(200, {}, match_payload('EUW1_1'))]
+        StubHandler.scripts['/tft/match/v1/matches/EUW1_2'] = [(404, {}, {})]
+        StubHandler.scripts['/tft/match/v1/matches/NA1_3'] = [(200, {}, match_payload('NA1_3'))]
+
+        matches = riot_api.get_match_info(['EUW1_1', 'EUW1_2', 'NA1_3'], 'test-key')
+
+        self.assertEqual(sorted(match['metadata']['match_id'] for match in matches), ['EUW1_1', 'NA1_3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,16 @@
-from riot_api import get_puuid, get_matchid, get_match_info, get_champion_cost
-from models import add_player, get_existing_match_ids, store_match, store_participant_relations, get_player_matches
-from db import get_supabase_client
-import os
-from dotenv import load_dotenv
-import time
-
-load_dotenv()
-API_KEY = os.getenv('API_KEY')
-
-supabase = get_supabase_client()
+from models import (iter_player_matches, iter_player_raw_matches, iter_raw_matches, get_player, get_player_aggregates,
+                    get_board_values, chunked, MATCH_CHUNK_SIZE)
+from aggregates import OVERALL, empty_aggregate, merge_rows, summarize
+from ingest import update_player_data
+from static_data import get_champion_costs
+from columnar import flatten_matches, champion_stats
+from boards import parse_participant
+from features import board_value
+from render import render_report, open_output
+from db import get_storage_client
+import metrics
+
+supabase = get_storage_client()
 
 TRAIT_MAPPING = {
     'ElTigre': 'The Champ',
@@ -47,106 +49,142 @@ GAMETYPE_MAPPING = {
     'pairs' : 'Double Up'
 }
 
-CHAMPION_COSTS = get_champion_cost()
-
 def calculate_board_value(units):
-    return sum(CHAMPION_COSTS.get(unit['character_id'].split('_')[1], 0) for unit in units)
+    champion_costs = get_champion_costs()
+    return sum(champion_costs.get(unit.champion_name, 0) * 3 ** (unit.stars - 1) for unit in units)
+
+def get_board_value(board):
+    # Stored boards carry the value computed at ingest; older rows fall back to Data Dragon costs
+    return board.board_value if board.board_value is not None else calculate_board_value(board.units)
 
 def get_champion_name(unit):
-    return unit['character_id'].split('_')[1]
+    return unit.champion_name
 
 
 def format_unit_info(unit):
-    clean_name = get_champion_name(unit)
-    clean_items = [item.split('_')[-1] for item in unit['itemNames']]
-    mapped_items = [ITEM_MAPPING.get(item, item) for item in clean_items]
+    clean_name = unit.champion_name
+    mapped_items = [ITEM_MAPPING.get(item, item) for item in unit.item_names]
     items_str = f" ({', '.join(mapped_items)})" if mapped_items else " (no items)"
     return f'{clean_name}{items_str}'
 
 def format_traits_info(traits):
     active_traits = []
     for trait in traits:
-        if trait['tier_current'] > 0:
-            clean_trait = trait['name'].split('_')[1]
-            mapped_trait = TRAIT_MAPPING.get(clean_trait, clean_trait)
-            num_units = trait['num_units']
-            active_traits.append(f'{num_units} {mapped_trait}')
+        if trait.tier > 0:
+            mapped_trait = TRAIT_MAPPING.get(trait.name, trait.name)
+            active_traits.append(f'{trait.num_units} {mapped_trait}')
     return active_traits
 
-def format_participant_info(participant):
-    placement = participant['placement']
-    riot_id_game_name = participant['riotIdGameName']
-    total_damage = participant['total_damage_to_players']
-    board_value = calculate_board_value(participant['units'])
-    
-    participant_text = f'{placement}_{riot_id_game_name} ({total_damage} damage to players):\n'
-    participant_text += f'Characters (Total board value: {board_value}):\n'
-    
-    for unit in participant['units']:
-        participant_text += format_unit_info(unit) + '\n'
-    
-    participant_text += '\nTraits:\n'
-    
-    active_traits = format_traits_info(participant['traits'])
-    for trait in active_traits:
-        participant_text += trait + '\n'
-    
-    return participant_text
-
-def display_single_match(match_info, match_number):
+def participant_lines(board):
+    yield f'{board.placement}_{board.riot_id_game_name} ({board.total_damage_to_players} damage to players):'
+    yield f'Characters (Total board value: {get_board_value(board)}):'
+    for unit in board.units:
+        yield format_unit_info(unit)
+    yield ''
+    yield 'Traits:'
+    yield from format_traits_info(board.traits)
+
+def format_participant_info(board):
+    return ''.join(f'{line}\n' for line in participant_lines(board))
+
+def sorted_boards(match_info, board_values=None):
+    boards = []
+    match_id = match_info['metadata']['match_id']
+    for participant in sorted(match_info['info']['participants'], key=lambda p: p['placement']):
+        board = parse_participant(match_info, participant)
+        # Tracked players' boards carry the value stored at ingest; only other participants are valued here
+        stored_value = (board_values or {}).get((match_id, participant['puuid']))
+        board.board_value = stored_value if stored_value is not None else board_value(participant['units'])
+        boards.append(board)
+    return boards
+
+def with_board_values(numbered_matches, chunk_size=MATCH_CHUNK_SIZE):
+    for chunk in chunked(numbered_matches, chunk_size):
+        board_values = get_board_values([match_info['metadata']['match_id'] for _, match_info in chunk])
+        for number, match_info in chunk:
+            yield number, match_info, board_values
+
+def match_lines(match_info, match_number, board_values=None):
     game_type = match_info['info']['tft_game_type']
     mapped_game_type = GAMETYPE_MAPPING.get(game_type, game_type)
-    
-    print(f"=== MATCH {match_number} {mapped_game_type} ===")
-    
-    sorted_participants = sorted(match_info['info']['participants'], key=lambda p: p['placement'])
-    
-    for participant in sorted_participants:
-        participant_info = format_participant_info(participant)
-        print(participant_info)
-    
-    print("\n" + "="*50 + "\n")
 
-def display_matches(match_data, match_indices=None):
+    yield f"=== MATCH {match_number} {mapped_game_type} ==="
+    for board in sorted_boards(match_info, board_values):
+        yield from participant_lines(board)
+        yield ''
+    yield ''
+    yield '=' * 50
+    yield ''
+
+MATCH_COLUMNS = ('match_id', 'game_type', 'placement', 'riot_id_game_name', 'total_damage_to_players',
+                 'board_value', 'level', 'gold_left', 'units', 'traits')
+
+def match_records(match_info, board_values=None):
+    for board in sorted_boards(match_info, board_values):
+        yield {
+            'match_id': board.match_id,
+            'game_type': board.game_type,
+            'placement': board.placement,
+            'riot_id_game_name': board.riot_id_game_name,
+            'total_damage_to_players': board.total_damage_to_players,
+            'board_value': get_board_value(board),
+            'level': board.level,
+            'gold_left': board.gold_left,
+            'units': [format_unit_info(unit) for unit in board.units],
+            'traits': format_traits_info(board.traits)
+        }
+
+def render_matches(numbered_matches, fmt='text', out=None):
+    render_report(fmt,
+                  lambda: (line for number, match_info, board_values in with_board_values(numbered_matches)
+                           for line in match_lines(match_info, number, board_values)),
+                  lambda: (record for _, match_info, board_values in with_board_values(numbered_matches)
+                           for record in match_records(match_info, board_values)),
+                  MATCH_COLUMNS, out)
+
+def display_single_match(match_info, match_number, fmt='text', out=None):
+    render_matches([(match_number, match_info)], fmt, out)
+
+def display_matches(match_data, match_indices=None, fmt='text', out=None):
     if match_indices is None:
         match_indices = range(len(match_data))
-    
-    for match_index in match_indices:
-        display_single_match(match_data[match_index], match_index + 1)
 
-def display_game_type_stats(filtered_matches, display_name):
-    if filtered_matches:
-        placements = [match['placement'] for match in filtered_matches]
-        avg_placement = sum(placements) / len(placements)
-        print(f'{display_name} average: {round(avg_placement, 2)} ({len(filtered_matches)} matches)')
-        print(f'{display_name} placements: {placements}')
+    render_matches(((match_index + 1, match_data[match_index]) for match_index in match_indices), fmt, out)
+
+def export_matches(path=None, puuid=None, fmt='text'):
+    matches = iter_raw_matches() if puuid is None else iter_player_raw_matches(puuid)
+    with open_output(path) as out:
+        render_matches(enumerate(matches, 1), fmt, out)
+
+def display_game_type_stats(stats, display_name):
+    if stats:
+        print(f'{display_name} average: {round(stats["avg_placement"], 2)} ({stats["games"]} matches)')
+        print(f'{display_name} placements: {stats["placement_hist"]}')
 
 def display_user_stats(puuid):
-    user_matches = get_player_matches(puuid)
-    if not user_matches:
+    rows = get_player_aggregates(puuid, champion=OVERALL)
+    stats = summarize(merge_rows(rows))
+
+    if not stats:
         print('No matches found for this player')
         return
-    
-    username = user_matches[0]['riotIdGameName']
-    placements = [match['placement'] for match in user_matches]
-    avg_placement = sum(placements)/len(placements)
 
-    print(f'{username} average placement: {round(avg_placement, 2)} (Number of matches: {len(user_matches)})')
-    print(f'Placements: {placements}')
+    player = get_player(puuid)
+    username = player['username'] if player else puuid
+    by_type = merge_rows(rows, key=lambda row: row['game_type'])
 
-    ranked_matches = [m for m in user_matches if m['game_type'] == 'standard']
-    display_game_type_stats(ranked_matches, 'Ranked')
+    print(f'{username} average placement: {round(stats["avg_placement"], 2)} (Number of matches: {stats["games"]})')
+    print(f'Placements: {stats["placement_hist"]}')
 
-    doubleup_matches = [m for m in user_matches if m['game_type'] == 'pairs']
-    display_game_type_stats(doubleup_matches, 'DoubleUp')    
+    display_game_type_stats(summarize(by_type.get('standard', empty_aggregate())), 'Ranked')
+    display_game_type_stats(summarize(by_type.get('pairs', empty_aggregate())), 'DoubleUp')
 
 
 def display_user_champion_games(puuid, top_champions):
     champion_count = {}
-    user_matches = get_player_matches(puuid)
 
-    for match in user_matches:
-        for unit in match['units']:
+    for match in iter_player_matches(puuid):
+        for unit in match.units:
             champion_name = get_champion_name(unit)
             champion_count[champion_name] = champion_count.get(champion_name,0) + 1
     
@@ -156,40 +194,31 @@ def display_user_champion_games(puuid, top_champions):
         print(f'{champion}: {count} times')
 
 
+@metrics.timed('analysis_seconds', stage='champion_perfs')
 def analyze_champion_perfs(user_matches):
-    champion_stats = {}
+    return champion_stats(flatten_matches(user_matches))
 
-    for match in user_matches:
-        placement = match['placement']
-        for unit in match['units']:
-            champion_name = get_champion_name(unit)
-            if champion_name not in champion_stats:
-                champion_stats[champion_name] = {'placements': []}
-            
-            champion_stats[champion_name]['placements'].append(placement)
-    
-    for champion, data in champion_stats.items():
-        placements = data['placements']
-        data['games'] = len(placements)
-        data['avg_placement'] = sum(placements)/len(placements)
 
-        data['top4_count'] = sum(1 for p in placements if p <=4)
-        data['top4_rate'] = (data['top4_count']/data['games'])*100
+def get_champion_performance(puuid, game_type=None, patch=None):
+    rows = [row for row in get_player_aggregates(puuid, game_type=game_type, patch=patch) if row['champion'] != OVERALL]
+    return {champion: summarize(aggregate)
+            for champion, aggregate in merge_rows(rows, key=lambda row: row['champion']).items()}
 
-        data['win_count'] = sum(1 for p in placements if p ==1)
-        data['win_rate'] = (data['win_count']/data['games'])*100
-    
-    return champion_stats
 
+CHAMPION_COLUMNS = ('champion', 'games', 'avg_placement', 'top4_rate', 'win_rate')
 
-def display_champion_performance(puuid):
-    user_matches = get_player_matches(puuid)
-    
-    if not user_matches:
-        print('No matches found for this player')
-        return
-    
-    champion_stats = analyze_champion_perfs(user_matches)
+def champion_performance_lines(sorted_champions):
+    yield f'{'Champion':<15} {'Games':<6} {'Avg Place':<10} {'Top 4%':<8} {'Win %':<8}'
+    yield '-'*55
+
+    for champion,stats in sorted_champions:
+        yield (f'{champion:<15} {stats['games']:<6} '
+               f'{stats['avg_placement']:<10.2f} '
+               f'{stats['top4_rate']:<8.1f}% '
+               f'{stats['win_rate']:<8.1f}%')
+
+def display_champion_performance(puuid, fmt='text', out=None):
+    champion_stats = get_champion_performance(puuid)
 
     if not champion_stats:
         print('No champion stats for this player')
@@ -200,63 +229,13 @@ def display_champion_performance(puuid):
                               reverse= True)
     sorted_champions = [(champ, stats) for champ, stats in sorted_champions 
                    if stats['games'] >= 3]
-    print(f'{'Champion':<15} {'Games':<6} {'Avg Place':<10} {'Top 4%':<8} {'Win %':<8}')
-    print('-'*55)
-
-    for champion,stats in sorted_champions:
-        print(f'{champion:<15} {stats['games']:<6} '
-              f'{stats['avg_placement']:<10.2f} '
-              f'{stats['top4_rate']:<8.1f}% '
-              f'{stats['win_rate']:<8.1f}%')
 
+    render_report(fmt,
+                  lambda: champion_performance_lines(sorted_champions),
+                  lambda: ({'champion': champion, **{column: stats[column] for column in CHAMPION_COLUMNS[1:]}}
+                           for champion, stats in sorted_champions),
+                  CHAMPION_COLUMNS, out)
 
-def update_player_data(username, tag, max_matches=200, batch_size=25, delay_between_batches=10):
-
-    puuid = get_puuid(username, tag, API_KEY)
-    if not puuid:
-        print(f'Could not get PUUID')
-        return None
-    
-    add_player(username, tag, puuid)
-    existing_ids = get_existing_match_ids()
-    total_new_matches = 0
-    
-    for start_idx in range(0, max_matches, batch_size):
-        current_batch_size = min(batch_size, max_matches - start_idx)
-        print(f"\nBatch {start_idx//batch_size + 1}: Getting matches {start_idx}-{start_idx + current_batch_size - 1}")
-        
-        match_ids = get_matchid(puuid, start_idx, current_batch_size, API_KEY)
-        if not match_ids:
-            print(f'Could not get match IDs for batch {start_idx//batch_size + 1}')
-            break
-        
-        new_match_ids = [mid for mid in match_ids if mid not in existing_ids]
-        
-        if not new_match_ids:
-            print('No new matches in this batch, stopping')
-            break
-        
-        print(f'Found {len(new_match_ids)} new matches out of {len(match_ids)} in this batch')
-        
-        match_data = get_match_info(new_match_ids, API_KEY)
-        if match_data:
-            for match in match_data:
-                store_match(match)
-                store_participant_relations(match)
-                existing_ids.add(match['metadata']['match_id'])
-            
-            total_new_matches += len(match_data)
-            print(f'Batch {start_idx//batch_size + 1} complete')
-        else:
-            print(f'Failed to fetch match data for batch {start_idx//batch_size + 1}')
-            break
-        
-        if start_idx + batch_size < max_matches and new_match_ids:
-            print(f'Waiting {delay_between_batches}s')
-            time.sleep(delay_between_batches)
-    
-    print(f'\nAdded {total_new_matches} new matches total.')
-    return puuid
 
 if __name__ == '__main__':
     puuid = update_player_data('Tourtipouss','9861',max_matches = 50)